@@ -1,33 +1,66 @@
-from flask import Flask
+from flask import Flask, g, request
 from flask_cors import CORS
 from flask_socketio import SocketIO
+from . import config
 from .websocket.chat_handler import init_socketio, socketio
 from .websocket.navigation_ws import NavigationNamespace
+from .websocket.timelapse_ws import TimelapseNamespace
+from .services.dataset import get_default_dataset
+from .services.incident_ingest import IncidentIngester
+from .services.tiles import TileCache
+from .utils.logs import configure_logging
+from .utils.metrics import HTTP_REQUESTS, IN_FLIGHT
 
-def create_app():
+def create_app(dataset=None, chat_agent=None):
+    configure_logging()
     app = Flask(__name__)
     CORS(app)  # Enable CORS for all routes
     app.config["SECRET_KEY"] = "your-secret-key"
 
-    # Configure SocketIO
-    socketio.init_app(app, 
-                     cors_allowed_origins="*",
-                     async_mode='threading',
-                     logger=True,
-                     engineio_logger=True)
+    # Initialize WebSocket handler; chat_agent replaces the configured model, e.g. with a local fake
+    init_socketio(app, agent=chat_agent)
+
+    # One crime dataset per process, loaded lazily and shared by every handler
+    dataset = dataset or get_default_dataset()
+    dataset.init_app(app)
+    if config.PRELOAD_DATASET:
+        dataset.preload()
+    # Fold incidents logged through the chat into risk scoring as they arrive
+    IncidentIngester(dataset).start().init_app(app)
+    # Heatmap tiles rendered on demand, cached on disk and in memory
+    TileCache(dataset).init_app(app)
 
     from .routes.chat import chat_bp
     from .routes.navigation import navigation_bp
     from .routes.timelapse import timelapse_bp
+    from .routes.tiles import tiles_bp
+    from .routes.metrics import metrics_bp
 
     app.register_blueprint(chat_bp, url_prefix="/chat")
     app.register_blueprint(navigation_bp, url_prefix="/navigation")
     app.register_blueprint(timelapse_bp, url_prefix="/timelapse")
+    app.register_blueprint(tiles_bp, url_prefix="/tiles")
+    app.register_blueprint(metrics_bp, url_prefix="/metrics")
+
+    # Count HTTP requests per endpoint and status, and those still being handled
+    @app.before_request
+    def _start_request():
+        IN_FLIGHT.labels("http").inc()
+        g.in_flight = True
+
+    @app.after_request
+    def _count_request(response):
+        HTTP_REQUESTS.labels(request.endpoint or "unmatched", response.status_code).inc()
+        return response
+
+    @app.teardown_request
+    def _end_request(exc=None):
+        # Socket.IO events tear down request contexts too, without ever starting a request
+        if g.pop("in_flight", False):
+            IN_FLIGHT.labels("http").dec()
 
-    # Initialize WebSocket handler
-    init_socketio(app)
-    
-    # Register navigation namespace
-    socketio.on_namespace(NavigationNamespace('/navigation'))
+    # Register navigation and timelapse namespaces
+    socketio.on_namespace(NavigationNamespace('/navigation', dataset=dataset))
+    socketio.on_namespace(TimelapseNamespace('/timelapse', dataset=dataset))
 
     return app
@@ -0,0 +1,96 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+CACHE_DIR = Path(os.getenv("CACHE_DIR", DATA_DIR / "cache"))
+
+# Radius used to score a coordinate against nearby crimes
+RISK_RADIUS_M = float(os.getenv("RISK_RADIUS_M", "50"))
+# Cell size of the precomputed risk grid; "index" lookups use the exact KD-tree instead
+RISK_GRID_RESOLUTION_M = float(os.getenv("RISK_GRID_RESOLUTION_M", "25"))
+RISK_LOOKUP = os.getenv("RISK_LOOKUP", "grid")
+# Time of day: hour-of-week risk multipliers on cells of this size, pooled over this many hours either
+# side and shrunk towards 1 when backed by few crimes; departure times are read in the data's time zone
+RISK_CUBE_RESOLUTION_M = float(os.getenv("RISK_CUBE_RESOLUTION_M", "250"))
+RISK_CUBE_WINDOW_H = int(os.getenv("RISK_CUBE_WINDOW_H", "1"))
+RISK_CUBE_PRIOR_COUNT = float(os.getenv("RISK_CUBE_PRIOR_COUNT", "10"))
+CRIME_TIMEZONE = os.getenv("CRIME_TIMEZONE", "America/Chicago")
+# Route geometry before scoring: Douglas-Peucker tolerance (0 keeps every OSRM vertex), and the
+# longest stretch left without a scored point (0 disables resampling); at twice the risk radius,
+# every point of the route is within the radius of a scored one
+ROUTE_SIMPLIFY_TOLERANCE_M = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_M", "5"))
+ROUTE_SAMPLE_SPACING_M = float(os.getenv("ROUTE_SAMPLE_SPACING_M", str(2 * RISK_RADIUS_M)))
+
+# Heatmap level of detail: cell width in screen pixels, and the zoom from which raw points are sent
+HEATMAP_CELL_PX = int(os.getenv("HEATMAP_CELL_PX", "32"))
+HEATMAP_POINTS_MIN_ZOOM = int(os.getenv("HEATMAP_POINTS_MIN_ZOOM", "15"))
+
+# Heatmap tiles: in-memory LRU size on top of the disk cache, the most the disk cache may hold,
+# how long clients and CDNs may keep a tile, the deepest zoom served, and the risk sum per 4 px
+# cell drawn at full heat at zoom 14
+TILE_MEMORY_CACHE_MB = float(os.getenv("TILE_MEMORY_CACHE_MB", "64"))
+TILE_DISK_CACHE_MB = float(os.getenv("TILE_DISK_CACHE_MB", "1024"))
+TILE_MAX_AGE = int(os.getenv("TILE_MAX_AGE", "86400"))
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "18"))
+TILE_FULL_INTENSITY = float(os.getenv("TILE_FULL_INTENSITY", "50"))
+
+# Routing backend; point OSRM_BASE_URL at a self-hosted OSRM in production
+OSRM_BASE_URL = os.getenv("OSRM_BASE_URL", "http://router.project-osrm.org")
+OSRM_PROFILE = os.getenv("OSRM_PROFILE", "driving")
+OSRM_CONNECT_TIMEOUT = float(os.getenv("OSRM_CONNECT_TIMEOUT", "3.05"))
+OSRM_READ_TIMEOUT = float(os.getenv("OSRM_READ_TIMEOUT", "10"))
+OSRM_RETRIES = int(os.getenv("OSRM_RETRIES", "2"))
+OSRM_POOL_SIZE = int(os.getenv("OSRM_POOL_SIZE", "10"))
+# Route responses are cached per start/end rounded to this many decimals (4 ~ 11m)
+OSRM_CACHE_SIZE = int(os.getenv("OSRM_CACHE_SIZE", "1024"))
+OSRM_CACHE_TTL = float(os.getenv("OSRM_CACHE_TTL", "600"))
+OSRM_COORD_PRECISION = int(os.getenv("OSRM_COORD_PRECISION", "4"))
+
+# Concurrency: Socket.IO async mode, and the bounded pool for CPU-bound work such as risk scoring
+SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Scaling out: a message queue URL (redis://, kafka://, zmq+tcp://, amqp://, or local:// in-process)
+# lets several workers share clients and rooms; preloading loads the dataset before workers fork
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "citisafe")
+PRELOAD_DATASET = os.getenv("PRELOAD_DATASET", "false").lower() in ("1", "true", "yes")
+
+# Chat model: a Gemini model name, or "echo" for the offline stand-in that needs no API key
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gemini-2.0-flash")
+# Per-client chat history: exchanges kept, their token budget, and how many idle sessions are held
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "10"))
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "4000"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+CHAT_SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", "1800"))
+# Replies to repeated opening questions: entries, lifetime, and the n-gram cosine similarity
+# that also counts as a repeat (0 keeps only exact matches of the normalized message)
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "512"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0"))
+
+# Incident log: appends committed together per batch, waiting at most this long for more to join
+INCIDENT_BATCH_SIZE = int(os.getenv("INCIDENT_BATCH_SIZE", "64"))
+INCIDENT_FLUSH_INTERVAL = float(os.getenv("INCIDENT_FLUSH_INTERVAL", "0.005"))
+# Seconds between polls of the incident log for new incidents to score (0 disables ingestion),
+# and between writes of the updated risk grid back to the cache
+INCIDENT_INGEST_INTERVAL = float(os.getenv("INCIDENT_INGEST_INTERVAL", "2"))
+INCIDENT_PERSIST_INTERVAL = float(os.getenv("INCIDENT_PERSIST_INTERVAL", "300"))
+
+# Local safest-route search: OSM extract the road graph is built from, its travel profile,
+# the default risk/distance trade-off (0 = shortest) and how many alternatives to return
+OSM_EXTRACT = os.getenv("OSM_EXTRACT", "")
+ROAD_GRAPH_PROFILE = os.getenv("ROAD_GRAPH_PROFILE", "driving")
+SAFE_ROUTE_RISK_WEIGHT = float(os.getenv("SAFE_ROUTE_RISK_WEIGHT", "1.0"))
+SAFE_ROUTE_ALTERNATIVES = int(os.getenv("SAFE_ROUTE_ALTERNATIVES", "3"))
+
+# Logging: level, "text" or "json" lines, the share of per-request DEBUG/INFO events kept,
+# and whether Socket.IO and Engine.IO log every packet
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+SOCKETIO_LOGGING = os.getenv("SOCKETIO_LOGGING", "false").lower() in ("1", "true", "yes")
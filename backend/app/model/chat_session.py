@@ -0,0 +1,88 @@
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from app import config
+from app.utils.cache import TTLCache
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), cheap enough to run on every turn"""
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    """One client's recent conversation, kept within a turn limit and a token budget.
+
+    Only whole user/model exchanges are kept, oldest dropped first, so the
+    history sent to the model always alternates roles starting with the user.
+    """
+
+    def __init__(self, max_turns: int = None, max_tokens: int = None):
+        self.max_turns = config.CHAT_HISTORY_TURNS if max_turns is None else max_turns
+        self.max_tokens = config.CHAT_HISTORY_TOKENS if max_tokens is None else max_tokens
+        self._exchanges = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._exchanges)
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def add_exchange(self, user_text: str, model_text: str):
+        """Record a completed turn, then drop the oldest ones beyond the turn or token limit"""
+        tokens = estimate_tokens(user_text) + estimate_tokens(model_text)
+        with self._lock:
+            self._exchanges.append((user_text, model_text, tokens))
+            self._tokens += tokens
+            while self._exchanges and (len(self._exchanges) > self.max_turns or self._tokens > self.max_tokens):
+                self._tokens -= self._exchanges.popleft()[2]
+
+    def contents(self, system_prompt: str, message: str) -> List[Dict[str, Any]]:
+        """Gemini `contents` for the next turn: the history followed by `message`, system prompt first"""
+        with self._lock:
+            exchanges = list(self._exchanges)
+        contents = []
+        for user_text, model_text, _ in exchanges:
+            contents.append({"role": "user", "parts": [user_text]})
+            contents.append({"role": "model", "parts": [model_text]})
+        contents.append({"role": "user", "parts": [message]})
+        contents[0]["parts"].insert(0, system_prompt)
+        return contents
+
+    def clear(self):
+        with self._lock:
+            self._exchanges.clear()
+            self._tokens = 0
+
+
+class SessionStore:
+    """Chat sessions by client id, bounded in number and evicted least recently used first.
+
+    Sessions idle for longer than `idle_ttl` seconds expire, so memory stays
+    bounded however many clients come and go.
+    """
+
+    def __init__(self, max_sessions: int = None, idle_ttl: float = None):
+        self._sessions = TTLCache(config.CHAT_MAX_SESSIONS if max_sessions is None else max_sessions,
+                                  config.CHAT_SESSION_IDLE_TTL if idle_ttl is None else idle_ttl,
+                                  sliding=True)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id) -> ChatSession:
+        """The client's session, starting a new one if it has none (or it expired)"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ChatSession()
+                self._sessions.set(session_id, session)
+            return session
+
+    def drop(self, session_id) -> Optional[ChatSession]:
+        return self._sessions.pop(session_id)
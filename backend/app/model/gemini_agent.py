@@ -1,11 +1,24 @@
-from typing import List, Dict, Any, Callable
+from typing import List, Dict, Any, Callable, Iterator, Optional
 import google.generativeai as genai
 from datetime import datetime
-import json
 import os
-from pathlib import Path
+import threading
+import time
 from dataclasses import dataclass
 from enum import Enum
+from app.model.chat_session import SessionStore
+from app.model.response_cache import ResponseCache
+from app.services.incident_store import IncidentStore, get_default_incident_store
+from app.utils.metrics import CHAT_CACHE_HITS, CHAT_CACHE_MISSES, CHAT_MODEL_SECONDS, CHAT_MODEL_TOKENS
+
+
+def _record_usage(response):
+    """Observe the prompt and reply token counts a Gemini response reports, if any"""
+    usage = getattr(response, "usage_metadata", None)
+    for kind, attr in (("prompt", "prompt_token_count"), ("reply", "candidates_token_count")):
+        count = getattr(usage, attr, None)
+        if count:
+            CHAT_MODEL_TOKENS.labels(kind).observe(count)
 
 class ToolCategory(Enum):
     SEARCH = "search"
@@ -21,15 +34,21 @@ class Tool:
     parameters: Dict[str, Any]
 
 class GeminiAgent:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+    def __init__(self, api_key: str = None, model=None, model_name: str = 'gemini-2.0-flash',
+                 sessions: SessionStore = None, response_cache: ResponseCache = None,
+                 incident_store: IncidentStore = None):
+        # Any object with a Gemini-style generate_content(contents, stream=...) can stand in for the model
+        if model is None:
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
         self.tools: Dict[str, Tool] = {}
+        # Rendered once and reused by every turn until the tool set changes
+        self._cached_system_prompt: Optional[str] = None
         self._register_default_tools()
-        self.incidents_file = Path("app/data/incidents.json")
-        self.incidents_file.parent.mkdir(parents=True, exist_ok=True)
-        if not self.incidents_file.exists():
-            self.incidents_file.write_text("[]")
+        self.incident_store = incident_store
 
     def _register_default_tools(self):
         self.register_tool(
@@ -66,20 +85,53 @@ class GeminiAgent:
             function=function,
             parameters=parameters
         )
+        self._cached_system_prompt = None
+
+    def _contents(self, message: str, session_id=None) -> List[Any]:
+        """Prompt for one turn: the system prompt, the session's history if any, then the message"""
+        if session_id is None:
+            return [self._system_prompt(), message]
+        return self.sessions.get(session_id).contents(self._system_prompt(), message)
+
+    def _cached_reply(self, message: str, session_id=None) -> Optional[str]:
+        """A cached reply for an opening question; follow-ups depend on their history and always go to the model"""
+        if session_id is not None and len(self.sessions.get(session_id)):
+            return None
+        cached = self.response_cache.get(self._system_prompt(), message)
+        # Only lookups are counted, so hits / (hits + misses) is the cache's hit rate
+        (CHAT_CACHE_MISSES if cached is None else CHAT_CACHE_HITS).inc()
+        return cached
+
+    def _cache_reply(self, message: str, reply: str, session_id=None):
+        if session_id is not None and len(self.sessions.get(session_id)):
+            return
+        self.response_cache.set(self._system_prompt(), message, reply)
+
+    def _remember(self, session_id, message: str, reply: str):
+        if session_id is not None and reply:
+            self.sessions.get(session_id).add_exchange(message, reply)
 
-    def chat(self, message: str) -> Dict[str, Any]:
+    def end_session(self, session_id):
+        """Forget a client's conversation, e.g. when it disconnects"""
+        self.sessions.drop(session_id)
+
+    def chat(self, message: str, session_id=None) -> Dict[str, Any]:
         try:
-            # Create a system prompt that includes available tools
-            tools_description = self._get_tools_description()
-            system_prompt = f"""You are a security assistant with access to the following tools:
-            {tools_description}
-            Keep your responses concise and to the point.
-            When a user asks for something that can be done with these tools, explain what you can do and ask for permission to use the appropriate tool.
-            """
-            
-            response = self.model.generate_content(
-                contents=[system_prompt, message]
-            )
+            cached = self._cached_reply(message, session_id)
+            if cached is not None:
+                self._remember(session_id, message, cached)
+                return {
+                    "reply": cached,
+                    "status": "success",
+                    "cached": True
+                }
+            with CHAT_MODEL_SECONDS.labels("chat").time():
+                response = self.model.generate_content(
+                    contents=self._contents(message, session_id)
+                )
+            _record_usage(response)
+            self._cache_reply(message, response.text, session_id)
+            self._remember(session_id, message, response.text)
             return {
                 "reply": response.text,
                 "status": "success"
@@ -90,6 +142,70 @@ class GeminiAgent:
                 "status": "error"
             }
 
+    def chat_stream(self, message: str, cancelled: Optional[threading.Event] = None,
+                    session_id=None) -> Iterator[str]:
+        """Yield the reply's text as the model produces it.
+
+        Generation stops, and the model's stream is closed, as soon as
+        `cancelled` is set or the caller stops iterating. Whatever text was
+        produced, even if cut short, joins the session's history; only
+        complete replies are cached, and a cached one is yielded whole.
+        """
+        cached = self._cached_reply(message, session_id)
+        if cached is not None:
+            self._remember(session_id, message, cached)
+            yield cached
+            return
+
+        started = time.perf_counter()
+        response = self.model.generate_content(
+            contents=self._contents(message, session_id),
+            stream=True
+        )
+        chunks = iter(response)
+        reply = []
+        completed = False
+        chunk = None
+        try:
+            for chunk in chunks:
+                if cancelled is not None and cancelled.is_set():
+                    break
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. safety metadata only)
+                    continue
+                if text:
+                    reply.append(text)
+                    yield text
+            else:
+                completed = True
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+            if completed:
+                # Streamed responses report usage on their last chunk
+                CHAT_MODEL_SECONDS.labels("stream").observe(time.perf_counter() - started)
+                _record_usage(chunk)
+            if completed and reply:
+                self._cache_reply(message, "".join(reply), session_id)
+            self._remember(session_id, message, "".join(reply))
+
+    def _system_prompt(self) -> str:
+        """System prompt that includes available tools, rendered once per tool set"""
+        if self._cached_system_prompt is None:
+            self._cached_system_prompt = self._render_system_prompt()
+        return self._cached_system_prompt
+
+    def _render_system_prompt(self) -> str:
+        tools_description = self._get_tools_description()
+        return f"""You are a security assistant with access to the following tools:
+            {tools_description}
+            Keep your responses concise and to the point.
+            When a user asks for something that can be done with these tools, explain what you can do and ask for permission to use the appropriate tool.
+            """
+
     def _get_tools_description(self) -> str:
         """Generate a description of all available tools"""
         descriptions = []
@@ -105,16 +221,17 @@ class GeminiAgent:
             """)
         return "\n".join(descriptions)
 
-    def log_incident(self, incident_data: Dict[str, Any]) -> Dict[str, Any]:
+    def log_incident(self, incident_data: Dict[str, Any] = None, **fields) -> Dict[str, Any]:
+        """Append an incident; fields may come as one dict or, from tool calls, as keyword arguments"""
         try:
-            incidents = json.loads(self.incidents_file.read_text())
+            incident_data = {**(incident_data or {}), **fields}
             incident_data["timestamp"] = datetime.now().isoformat()
-            incidents.append(incident_data)
-            self.incidents_file.write_text(json.dumps(incidents, indent=2))
+            store = self.incident_store or get_default_incident_store()
+            incident_id = store.append(incident_data)
             return {
                 "status": "success",
                 "message": "Incident logged successfully",
-                "incident_id": len(incidents)
+                "incident_id": incident_id
             }
         except Exception as e:
             return {
@@ -0,0 +1,46 @@
+import time
+from dataclasses import dataclass
+from typing import Iterator, List
+
+
+@dataclass
+class LocalChunk:
+    text: str
+
+
+class LocalResponse:
+    """Mimics a Gemini response: `.text` for the whole reply, iteration for streamed chunks"""
+
+    def __init__(self, chunks: List[str], delay: float = 0.0):
+        self._chunks = chunks
+        self._delay = delay
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def __iter__(self) -> Iterator[LocalChunk]:
+        for chunk in self._chunks:
+            if self._delay:
+                time.sleep(self._delay)
+            yield LocalChunk(chunk)
+
+
+class EchoModel:
+    """Offline stand-in for the Gemini model that echoes the user's message back word by word.
+
+    Lets chat, streaming and cancellation run without an API key, e.g. in
+    development (`CHAT_MODEL=echo`) or when testing clients.
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+
+    def generate_content(self, contents, stream: bool = False, **kwargs) -> LocalResponse:
+        message = contents[-1] if isinstance(contents, (list, tuple)) else contents
+        if isinstance(message, dict):
+            # Multi-turn contents: echo the last part of the latest user turn
+            message = message["parts"][-1]
+        words = f"You said: {message}".split(" ")
+        chunks = [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+        return LocalResponse(chunks, self.delay if stream else 0.0)
@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+from app import config
+from app.utils.cache import TTLCache
+
+NGRAM_SIZE = 3
+EMBEDDING_DIM = 512
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace, so trivially different phrasings share a key"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", message.lower())).strip()
+
+
+def ngram_embedding(text: str, dim: int = EMBEDDING_DIM, n: int = NGRAM_SIZE) -> np.ndarray:
+    """Unit-length hashed character n-gram counts of normalized text, computed locally"""
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f" {text} "
+    for i in range(max(1, len(padded) - n + 1)):
+        vector[zlib.crc32(padded[i:i + n].encode()) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SimilarityIndex:
+    """Bounded LRU of embedded messages searched by cosine similarity.
+
+    Vectors live in one preallocated matrix, so a lookup is a single
+    matrix-vector product over at most `maxsize` rows.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, dim: int = EMBEDDING_DIM):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._vectors = np.zeros((max(maxsize, 0), dim), dtype=np.float32)
+        self._entries = [None] * max(maxsize, 0)
+        self._slots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, key: Hashable, scope: Hashable, vector: np.ndarray, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                slot = len(self._slots) if len(self._slots) < self.maxsize else self._slots.popitem(last=False)[1]
+            self._slots[key] = slot
+            self._vectors[slot] = vector
+            self._entries[slot] = (key, scope, value, expires_at)
+
+    def search(self, scope: Hashable, vector: np.ndarray, threshold: float):
+        """Best (value, similarity) in `scope` at or above threshold, or None"""
+        with self._lock:
+            if not self._slots:
+                return None
+            slots = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+            scores = self._vectors[slots] @ vector
+            now = time.monotonic()
+            for i in np.argsort(scores)[::-1]:
+                if scores[i] < threshold:
+                    return None
+                key, entry_scope, value, expires_at = self._entries[slots[i]]
+                if entry_scope != scope or (expires_at is not None and expires_at <= now):
+                    continue
+                self._slots.move_to_end(key)
+                return value, float(scores[i])
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+
+
+class ResponseCache:
+    """Model replies for repeated questions, looked up before calling the model.
+
+    The exact tier matches the normalized message under the same tool set
+    (`scope`). The optional similarity tier, enabled by a threshold in
+    (0, 1], also serves replies to messages whose n-gram embedding has at
+    least that cosine similarity to a cached one. Both tiers expire entries
+    after `ttl` seconds and evict least recently used beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None, similarity_threshold: float = None):
+        maxsize = config.CHAT_CACHE_SIZE if maxsize is None else maxsize
+        ttl = config.CHAT_CACHE_TTL if ttl is None else ttl
+        self.similarity_threshold = (config.CHAT_CACHE_SIMILARITY if similarity_threshold is None
+                                     else similarity_threshold)
+        self._exact = TTLCache(maxsize, ttl)
+        self._similar = SimilarityIndex(maxsize, ttl) if self.similarity_threshold > 0 else None
+        self._stats_lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0}
+
+    def get(self, scope: Hashable, message: str) -> Optional[str]:
+        normalized = normalize_message(message)
+        reply = self._exact.get((scope, normalized))
+        if reply is not None:
+            self._count("exact_hits")
+            return reply
+        if self._similar is not None:
+            match = self._similar.search(scope, ngram_embedding(normalized), self.similarity_threshold)
+            if match is not None:
+                self._count("similar_hits")
+                return match[0]
+        self._count("misses")
+        return None
+
+    def set(self, scope: Hashable, message: str, reply: str):
+        normalized = normalize_message(message)
+        self._exact.set((scope, normalized), reply)
+        if self._similar is not None:
+            self._similar.add((scope, normalized), scope, ngram_embedding(normalized), reply)
+        self._count("stores")
+
+    def clear(self):
+        self._exact.clear()
+        if self._similar is not None:
+            self._similar.clear()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, the hit rate and current size"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["similar_hits"]) / lookups if lookups else 0.0
+        stats["size"] = len(self._exact)
+        return stats
@@ -0,0 +1,10 @@
+from flask import Blueprint, Response
+
+from app.utils.metrics import render
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("", methods=["GET"])
+def metrics():
+    """This process's metrics in the Prometheus text exposition format"""
+    return Response(render(), mimetype="text/plain; version=0.0.4")
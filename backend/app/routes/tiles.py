@@ -0,0 +1,32 @@
+from flask import Blueprint, Response, jsonify, request
+
+from app import config
+from app.services.tiles import TILE_FORMATS, get_tile_cache
+
+tiles_bp = Blueprint("tiles", __name__)
+
+
+@tiles_bp.route("/<int:year>/<int:z>/<int:x>/<name>")
+def tile(year, z, x, name):
+    """One heatmap tile of a year's crimes: {y}.png (also plain {y}) or {y}.bin for the binary count/risk grid"""
+    y, _, fmt = name.partition(".")
+    fmt = fmt or "png"
+    if not y.isdigit() or fmt not in TILE_FORMATS:
+        return jsonify({'error': f'Tiles are named {{y}}.png or {{y}}.bin, not {name}'}), 404
+    y = int(y)
+    if not 0 <= z <= config.TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({'error': f'No tile {z}/{x}/{y}'}), 404
+
+    tiles = get_tile_cache()
+    if tiles.data_bounds(year) is None:
+        return jsonify({'error': f'No data for year {year}'}), 404
+    if not tiles.covers(year, z, x, y):
+        return jsonify({'error': f'Tile {z}/{x}/{y} is outside the {year} crime data'}), 404
+    data = tiles.get(year, z, x, y, fmt)
+
+    # Tiles only change with the crime data, which also changes their ETag
+    response = Response(data, mimetype=TILE_FORMATS[fmt])
+    response.cache_control.public = True
+    response.cache_control.max_age = config.TILE_MAX_AGE
+    response.set_etag(f"{tiles.version}-{year}-{z}-{x}-{y}-{fmt}")
+    return response.make_conditional(request)
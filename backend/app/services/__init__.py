@@ -0,0 +1 @@
+# This file makes the services directory a Python package.
@@ -0,0 +1,67 @@
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
+import numpy as np
+
+from app import config
+from app.services.crime_data import source_signature
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def meta_path(path: Path) -> Path:
+    """JSON sidecar describing the array saved at `path`"""
+    return Path(path).with_suffix('.json')
+
+
+def save_array(path, array: np.ndarray, meta: Dict[str, Any]):
+    """Write `array` as a .npy file next to its JSON sidecar.
+
+    Both are written then renamed, so workers never map a half-written array.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp.npy')
+    np.save(tmp_path, np.ascontiguousarray(array))
+    tmp_meta = path.with_suffix('.tmp.json')
+    tmp_meta.write_text(json.dumps(meta))
+    os.replace(tmp_path, path)
+    os.replace(tmp_meta, meta_path(path))
+
+
+def load_array(path, mmap: bool = True) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """A saved array, memory-mapped read-only so workers share its pages, and its sidecar"""
+    path = Path(path)
+    meta = json.loads(meta_path(path).read_text())
+    return np.load(path, mmap_mode='r' if mmap else None), meta
+
+
+def load_or_build(path, source_path, build: Callable[[], T], load: Callable[[Path], T], name: str) -> T:
+    """load(path) when its sidecar was written from the current `source_path`, else build() and save it first.
+
+    The built object is saved with `save(path, source=...)`, recording the
+    source file's signature so a changed file triggers a rebuild.
+    """
+    path = Path(path)
+    source = source_signature(source_path)
+    if path.exists() and meta_path(path).exists():
+        if json.loads(meta_path(path).read_text()).get("source") == source:
+            return load(path)
+        logger.info(f"{name} at {path} is stale, rebuilding")
+
+    build().save(path, source=source)
+    return load(path)
+
+
+def cli_parser(description: str, resolution_m: float) -> argparse.ArgumentParser:
+    """Command line shared by the cached rasters: --resolution-m and --cache-dir"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--resolution-m", type=float, default=resolution_m)
+    parser.add_argument("--cache-dir", default=str(config.CACHE_DIR))
+    return parser
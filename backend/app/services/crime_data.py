@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+CRIMES_CSV = config.DATA_DIR / "Crimes_df_with_risk.csv"
+CATEGORICAL_COLUMNS = ['Primary Type', 'Description', 'risk_level', 'FBI Code']
+
+CACHE_VERSION = 3
+MANIFEST_NAME = "crimes_manifest.json"
+
+
+def source_signature(path=CRIMES_CSV) -> Dict[str, int]:
+    """Cheap fingerprint of a source file used to detect stale derived caches"""
+    stat = Path(path).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_crime_frame(csv_path=CRIMES_CSV) -> pd.DataFrame:
+    """Read the crime CSV and parse it into compact dtypes shared by every consumer"""
+    df = pd.read_csv(csv_path)
+    # Points without coordinates can never match a spatial query
+    df = df.dropna(subset=['Latitude', 'Longitude']).reset_index(drop=True)
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d %H:%M:%S')
+    # Date order makes every year, month and date range a contiguous slice
+    df = df.sort_values('Date', kind='stable').reset_index(drop=True)
+    df['year'] = df['Date'].dt.year.astype(np.int16)
+    df['lat_rad'] = np.radians(df['Latitude']).astype(np.float32)
+    df['lng_rad'] = np.radians(df['Longitude']).astype(np.float32)
+    for col in ['Latitude', 'Longitude', 'severity_score', 'risk_factor']:
+        df[col] = df[col].astype(np.float32)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    # Remaining integer codes (District, Ward, month, ...) fit in a few bytes
+    for col in df.select_dtypes(include='integer').columns.drop(['ID', 'year'], errors='ignore'):
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    """Stream a file through SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_column_cache(df: pd.DataFrame, cache_dir: Path, source: Dict[str, Any]) -> Dict[str, Any]:
+    """Write one .npy file per column and publish them with an atomically replaced manifest.
+
+    Categoricals are stored as integer codes plus a unicode categories array
+    so the cache never needs pickle to load.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    column_dir = f"crimes-{uuid.uuid4().hex[:12]}"
+    (cache_dir / column_dir).mkdir()
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {"name": name, "file": f"{i:02d}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry["kind"] = "category"
+            entry["categories"] = f"{i:02d}_categories.npy"
+            np.save(cache_dir / column_dir / entry["categories"],
+                    np.asarray(series.cat.categories, dtype=str))
+            np.save(cache_dir / column_dir / entry["file"], series.cat.codes.to_numpy())
+        else:
+            entry["kind"] = "array"
+            np.save(cache_dir / column_dir / entry["file"], series.to_numpy())
+        columns.append(entry)
+
+    manifest = {
+        "version": CACHE_VERSION,
+        "source": source,
+        "dir": column_dir,
+        "rows": len(df),
+        "columns": columns
+    }
+    tmp_manifest = cache_dir / f"{MANIFEST_NAME}.{column_dir}.tmp"
+    tmp_manifest.write_text(json.dumps(manifest))
+    previous = _read_manifest(cache_dir)
+    os.replace(tmp_manifest, cache_dir / MANIFEST_NAME)
+
+    # Keep the previous generation for workers still reading it, drop anything older
+    keep = {column_dir, previous.get("dir") if previous else None}
+    for stale in cache_dir.glob("crimes-*"):
+        if stale.name not in keep:
+            shutil.rmtree(stale, ignore_errors=True)
+    return manifest
+
+
+def read_column_cache(cache_dir: Path, manifest: Dict[str, Any]) -> pd.DataFrame:
+    """Rebuild the DataFrame described by a manifest"""
+    column_dir = cache_dir / manifest["dir"]
+    data = {}
+    for entry in manifest["columns"]:
+        values = np.load(column_dir / entry["file"])
+        if entry["kind"] == "category":
+            categories = np.load(column_dir / entry["categories"])
+            values = pd.Categorical.from_codes(values, categories=categories.tolist())
+        data[entry["name"]] = values
+    return pd.DataFrame(data)
+
+
+def _read_manifest(cache_dir: Path):
+    try:
+        manifest = json.loads((cache_dir / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def load_cached_crime_frame(csv_path=CRIMES_CSV, cache_dir=None) -> pd.DataFrame:
+    """Load the parsed crime frame from its columnar cache, rebuilding only if the CSV changed.
+
+    A matching mtime and size is trusted as is; otherwise the CSV is hashed,
+    so a copied-but-identical file (as on a fresh deploy) still reuses the
+    cache instead of paying for a full parse.
+    """
+    cache_dir = Path(cache_dir or config.CACHE_DIR)
+    signature = source_signature(csv_path)
+    manifest = _read_manifest(cache_dir)
+
+    if manifest is not None:
+        cached = manifest["source"]
+        if all(cached.get(key) == value for key, value in signature.items()):
+            return read_column_cache(cache_dir, manifest)
+
+        sha256 = file_sha256(csv_path)
+        if cached.get("sha256") == sha256:
+            manifest["source"] = {**signature, "sha256": sha256}
+            tmp_manifest = cache_dir / f"{MANIFEST_NAME}.{uuid.uuid4().hex[:12]}.tmp"
+            tmp_manifest.write_text(json.dumps(manifest))
+            os.replace(tmp_manifest, cache_dir / MANIFEST_NAME)
+            return read_column_cache(cache_dir, manifest)
+    else:
+        sha256 = file_sha256(csv_path)
+
+    logger.info(f"Building columnar cache for {csv_path} in {cache_dir}")
+    df = load_crime_frame(csv_path)
+    write_column_cache(df, cache_dir, {**signature, "sha256": sha256})
+    return df
@@ -0,0 +1,47 @@
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from app.utils.geo import chord_to_meters, meters_to_chord, to_unit_vectors, unit_vectors_from_radians
+
+
+class CrimePointStore:
+    """Crime points with a KD-tree built once over their unit-sphere positions.
+
+    Points are indexed as 3D unit vectors so that the straight-line (chord)
+    distance used by the tree is monotonic in great circle distance; radius
+    queries are therefore exact and cost O(log N + matches).
+    """
+
+    def __init__(self, df: pd.DataFrame, lat_col: str = 'Latitude', lng_col: str = 'Longitude'):
+        self.df = df
+        if lat_col == 'Latitude' and {'lat_rad', 'lng_rad'}.issubset(df.columns):
+            xyz = unit_vectors_from_radians(df['lat_rad'].to_numpy(), df['lng_rad'].to_numpy())
+        else:
+            xyz = to_unit_vectors(df[lat_col].to_numpy(), df[lng_col].to_numpy())
+        self._tree = cKDTree(xyz)
+
+    def __len__(self):
+        return len(self.df)
+
+    def query_radius(self, lat: float, lng: float, radius_m: float) -> np.ndarray:
+        """Row positions of all points within radius_m of (lat, lng), ascending"""
+        idx = self._tree.query_ball_point(to_unit_vectors(lat, lng)[0], meters_to_chord(radius_m))
+        return np.sort(np.asarray(idx, dtype=np.intp))
+
+    def query_radius_batch(self, lats, lngs, radius_m: float) -> List[np.ndarray]:
+        """query_radius for many centers at once, one position array per center"""
+        if len(lats) == 0:
+            return []
+        matches = self._tree.query_ball_point(to_unit_vectors(lats, lngs), meters_to_chord(radius_m))
+        return [np.asarray(idx, dtype=np.intp) for idx in matches]
+
+    def query_nearest(self, lat: float, lng: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances in meters and row positions of the k nearest points"""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        chord, idx = self._tree.query(to_unit_vectors(lat, lng)[0], k=k)
+        return chord_to_meters(np.atleast_1d(chord)), np.atleast_1d(idx).astype(np.intp)
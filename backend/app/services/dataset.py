@@ -0,0 +1,139 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import pandas as pd
+from flask import current_app
+
+from app import config
+from app.services.crime_data import CRIMES_CSV, load_cached_crime_frame
+from app.services.crime_store import CrimePointStore
+from app.services.incident_ingest import IncidentLayer
+from app.services.risk_cube import RiskCube, load_or_build_risk_cube
+from app.services.risk_grid import RiskGrid, load_or_build_risk_grid
+from app.services.risk_scoring import RiskScorer
+from app.services.time_index import YearPartition, build_year_partitions
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_NAME = "crime_dataset"
+
+
+class CrimeDataset:
+    """Owns the crime frame and every structure derived from it.
+
+    Nothing is read until first use, and each piece is built once and then
+    shared by all blueprints and namespaces of the process.
+    """
+
+    def __init__(self, csv_path=CRIMES_CSV, cache_dir=None):
+        self.csv_path = csv_path
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._frame = None
+        self._store = None
+        self._grid = None
+        self._cube = None
+        self._scorer = None
+        self._partitions = None
+        # Logged incidents ingested after load, scored alongside the dataset's crimes
+        self.incident_layer = IncidentLayer()
+
+    def init_app(self, app):
+        """Expose the dataset to request handlers through app.extensions"""
+        app.extensions[EXTENSION_NAME] = self
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    df = load_cached_crime_frame(self.csv_path, self.cache_dir)
+                    logger.info(f"Loaded {len(df)} crime records "
+                                f"({df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB)")
+                    self._frame = df
+        return self._frame
+
+    @property
+    def store(self) -> CrimePointStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = CrimePointStore(self.frame)
+        return self._store
+
+    @property
+    def risk_grid(self) -> RiskGrid:
+        if self._grid is None:
+            with self._lock:
+                if self._grid is None:
+                    self._grid = load_or_build_risk_grid(lambda: self.frame, cache_dir=self.cache_dir,
+                                                         csv_path=self.csv_path)
+        return self._grid
+
+    @property
+    def risk_cube(self) -> RiskCube:
+        if self._cube is None:
+            with self._lock:
+                if self._cube is None:
+                    self._cube = load_or_build_risk_cube(lambda: self.frame, cache_dir=self.cache_dir,
+                                                         csv_path=self.csv_path)
+        return self._cube
+
+    @property
+    def risk_scorer(self) -> RiskScorer:
+        if self._scorer is None:
+            with self._lock:
+                if self._scorer is None:
+                    grid = self.risk_grid if config.RISK_LOOKUP == 'grid' else None
+                    self._scorer = RiskScorer(self.store, radius_m=config.RISK_RADIUS_M, grid=grid,
+                                              incidents=self.incident_layer)
+        return self._scorer
+
+    @property
+    def partitions(self) -> Dict[int, YearPartition]:
+        if self._partitions is None:
+            with self._lock:
+                if self._partitions is None:
+                    self._partitions = build_year_partitions(self.frame)
+        return self._partitions
+
+    @property
+    def years(self) -> List[int]:
+        """Years present in the dataset, ascending"""
+        return list(self.partitions)
+
+    def partition(self, year: int) -> Optional[YearPartition]:
+        return self.partitions.get(year)
+
+    def preload(self) -> "CrimeDataset":
+        """Build everything up front, e.g. in a server's master process before it forks.
+
+        Forked workers then share these pages copy-on-write (and the risk
+        grid and cube through their memory maps) instead of each loading its own copy.
+        """
+        self.risk_scorer
+        self.risk_cube
+        for partition in self.partitions.values():
+            partition.store
+        logger.info(f"Preloaded crime dataset: {len(self.frame)} records, {len(self.years)} years")
+        return self
+
+
+_default_dataset = None
+_default_lock = threading.Lock()
+
+
+def get_default_dataset() -> CrimeDataset:
+    """Process-wide dataset used when none is injected explicitly"""
+    global _default_dataset
+    if _default_dataset is None:
+        with _default_lock:
+            if _default_dataset is None:
+                _default_dataset = CrimeDataset()
+    return _default_dataset
+
+
+def get_dataset() -> CrimeDataset:
+    """Dataset registered on the current Flask app"""
+    return current_app.extensions[EXTENSION_NAME]
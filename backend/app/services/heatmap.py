@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app import config
+
+TILE_SIZE = 256
+# Deepest Web Mercator zoom level map clients request
+MAX_ZOOM = 22
+WEIGHT_COLUMNS = {"risk": "risk_factor", "severity": "severity_score"}
+MODES = ("auto", "points", "aggregate")
+
+
+def mercator_pixels(lat, lng, zoom: int):
+    """Web Mercator pixel coordinates of degree coordinates at a zoom level"""
+    world = TILE_SIZE * 2 ** zoom
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * world
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * world
+    return x, y
+
+
+def resolve_mode(mode: Optional[str], zoom: Optional[int]) -> str:
+    """Pick points or aggregate output; without a zoom level the legacy point list is kept"""
+    if zoom is not None and not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}")
+    mode = mode or ("auto" if zoom is not None else "points")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if mode == "auto":
+        return "points" if zoom >= config.HEATMAP_POINTS_MIN_ZOOM else "aggregate"
+    if mode == "aggregate" and zoom is None:
+        raise ValueError("zoom is required for aggregate mode")
+    return mode
+
+
+def check_weight(weight: str) -> str:
+    """Raise ValueError unless `weight` names a heatmap weight column"""
+    if weight not in WEIGHT_COLUMNS:
+        raise ValueError(f"weight must be one of {tuple(WEIGHT_COLUMNS)}")
+    return weight
+
+
+def aggregate_heatmap(df: pd.DataFrame, zoom: int, weight: str = "risk", cell_px: int = None,
+                      scale: Optional[np.ndarray] = None) -> Dict[str, List[float]]:
+    """Bin points into screen-sized cells at `zoom`, summing the chosen weight per cell.
+
+    Cells are `cell_px` Web Mercator pixels wide, so they look the same size at
+    every zoom level; each is placed at the mean position of its points.
+    `scale` optionally multiplies each point's weight first.
+    """
+    check_weight(weight)
+    cell_px = cell_px or config.HEATMAP_CELL_PX
+    if len(df) == 0:
+        return {"lat": [], "lng": [], "weight": [], "count": []}
+
+    lat = df['Latitude'].to_numpy(dtype=np.float64)
+    lng = df['Longitude'].to_numpy(dtype=np.float64)
+    x, y = mercator_pixels(lat, lng, zoom)
+    keys = np.floor(x / cell_px).astype(np.int64) * (TILE_SIZE * 2 ** zoom) + np.floor(y / cell_px).astype(np.int64)
+    _, cell_ids = np.unique(keys, return_inverse=True)
+    cell_ids = cell_ids.reshape(-1)
+
+    counts = np.bincount(cell_ids)
+    point_weights = df[WEIGHT_COLUMNS[weight]].to_numpy(dtype=np.float64)
+    if scale is not None:
+        point_weights = point_weights * scale
+    weights = np.bincount(cell_ids, weights=point_weights)
+    return {
+        "lat": np.round(np.bincount(cell_ids, weights=lat) / counts, 6).tolist(),
+        "lng": np.round(np.bincount(cell_ids, weights=lng) / counts, 6).tolist(),
+        "weight": weights.tolist(),
+        "count": counts.tolist()
+    }
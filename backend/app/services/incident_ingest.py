@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app import config
+from app.services.incident_store import IncidentStore, get_default_incident_store, incident_coordinates
+from app.services.risk_grid import grid_path
+from app.utils.geo import meters_to_chord, to_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_NAME = "incident_ingester"
+
+# risk_factor given to a logged incident by its reported severity, near the dataset's
+# mean risk factor for each risk level
+SEVERITY_RISK_FACTORS = {"low": 3.0, "medium": 6.0, "high": 9.0}
+
+
+def incident_risk_factor(record: Dict[str, Any]) -> float:
+    """Explicit risk_factor of an incident, else one derived from its severity"""
+    if record.get("risk_factor") is not None:
+        return float(record["risk_factor"])
+    return SEVERITY_RISK_FACTORS.get(str(record.get("severity", "")).lower(), SEVERITY_RISK_FACTORS["medium"])
+
+
+def incident_points(records: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Latitude, longitude and risk_factor arrays of the records that carry coordinates"""
+    points = []
+    for record in records:
+        lat, lng = incident_coordinates(record)
+        if lat is not None:
+            points.append((lat, lng, incident_risk_factor(record)))
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    return points[:, 0], points[:, 1], points[:, 2]
+
+
+class IncidentLayer:
+    """Crimes logged since the dataset was loaded, searchable next to its KD-tree.
+
+    Logged incidents are few compared with the dataset, so each batch
+    rebuilds this small tree rather than the main one. Readers always see
+    a complete snapshot, swapped in as one reference.
+    """
+
+    def __init__(self):
+        self._snapshot = (np.empty(0), None)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def add(self, lat, lng, risk):
+        if len(lat) == 0:
+            return
+        with self._lock:
+            risks, tree = self._snapshot
+            xyz = to_unit_vectors(lat, lng)
+            if tree is not None:
+                xyz = np.vstack([tree.data, xyz])
+            self._snapshot = (np.concatenate([risks, np.asarray(risk, dtype=np.float64)]), cKDTree(xyz))
+
+    def radius_sums(self, lats, lngs, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Sum of risk factors and count of incidents within radius_m of each center"""
+        risks, tree = self._snapshot
+        if tree is None:
+            return np.zeros(len(lats)), np.zeros(len(lats), dtype=np.intp)
+        matches = tree.query_ball_point(to_unit_vectors(lats, lngs), meters_to_chord(radius_m))
+        counts = np.fromiter((len(m) for m in matches), dtype=np.intp, count=len(matches))
+        sums = np.fromiter((risks[m].sum() for m in matches), dtype=np.float64, count=len(matches))
+        return sums, counts
+
+
+class IncidentIngester:
+    """Tails the incident log into a dataset's risk scoring without reloading it.
+
+    Every process polls the shared log for incidents above its watermark
+    (and is woken at once for ones it logs itself). New incidents with
+    coordinates join the dataset's IncidentLayer and update only the risk
+    grid cells around them. Every `persist_interval` seconds a changed grid
+    is written back with the id it is current through, so a restart only
+    replays what came after.
+    """
+
+    def __init__(self, dataset, store: IncidentStore = None, interval: float = None,
+                 persist_interval: float = None):
+        self.dataset = dataset
+        self._store = store
+        self.interval = config.INCIDENT_INGEST_INTERVAL if interval is None else interval
+        self.persist_interval = config.INCIDENT_PERSIST_INTERVAL if persist_interval is None else persist_interval
+        self.layer_through = 0
+        self._dirty = False
+        self._last_persist = time.monotonic()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._started = False
+
+    def init_app(self, app):
+        app.extensions[EXTENSION_NAME] = self
+
+    @property
+    def store(self) -> IncidentStore:
+        if self._store is None:
+            self._store = get_default_incident_store()
+            self._store.subscribe(lambda records: self._wake.set())
+        return self._store
+
+    def poll(self) -> int:
+        """Ingest incidents logged since the last poll; returns how many were read"""
+        with self._lock:
+            records = list(self.store.iter_after(self.layer_through))
+            if not records:
+                return 0
+            lat, lng, risk = incident_points(records)
+            self.dataset.incident_layer.add(lat, lng, risk)
+            self.layer_through = records[-1]["incident_id"]
+
+            grid = self.dataset.risk_scorer.grid
+            if grid is not None and self.layer_through > grid.incidents_through:
+                # A persisted grid already holds the incidents up to its watermark
+                lat, lng, risk = incident_points(r for r in records if r["incident_id"] > grid.incidents_through)
+                changed = grid.add_points(lat, lng, risk)
+                grid.incidents_through = self.layer_through
+                self._dirty = True
+                logger.info(f"Ingested {len(lat)} incidents through #{self.layer_through}, {changed} grid cells updated")
+            return len(records)
+
+    def persist(self):
+        """Write the updated risk grid back to its cache file"""
+        grid = self.dataset.risk_scorer.grid
+        with self._lock:
+            if grid is None or not self._dirty:
+                return
+            path = grid_path(grid.resolution_m, grid.radius_m, self.dataset.cache_dir)
+            _locked_save(grid, path)
+            self._dirty = False
+            self._last_persist = time.monotonic()
+        logger.info(f"Persisted risk grid through incident #{grid.incidents_through} to {path}")
+
+    def start(self) -> "IncidentIngester":
+        if self.interval <= 0 or self._started:
+            return self
+        self._started = True
+        self._start_thread()
+        # Threads don't survive fork: a preloaded master's ingester restarts in each worker
+        os.register_at_fork(after_in_child=self._start_thread)
+        return self
+
+    def _start_thread(self):
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="incident-ingester", daemon=True).start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+                if self._dirty and time.monotonic() - self._last_persist >= self.persist_interval:
+                    self.persist()
+            except Exception:
+                logger.exception("Incident ingestion failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+
+def _locked_save(grid, path):
+    """Save under an exclusive file lock so workers persisting at once never interleave cells and metadata"""
+    try:
+        import fcntl
+    except ImportError:  # no advisory locks on this platform
+        grid.save(path, source=grid.source)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_suffix('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        grid.save(path, source=grid.source)
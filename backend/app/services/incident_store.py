@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app import config
+from app.utils.metrics import INCIDENT_APPEND_SECONDS, INCIDENT_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INCIDENTS_DB = config.DATA_DIR / "incidents.db"
+LEGACY_INCIDENTS_JSON = config.DATA_DIR / "incidents.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    description TEXT,
+    location TEXT,
+    severity TEXT,
+    latitude REAL,
+    longitude REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents (timestamp);
+CREATE INDEX IF NOT EXISTS idx_incidents_location ON incidents (location);
+CREATE INDEX IF NOT EXISTS idx_incidents_lat_lng ON incidents (latitude, longitude);
+"""
+
+INSERT = ("INSERT INTO incidents (id, timestamp, description, location, severity, latitude, longitude, data) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def incident_coordinates(record: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """Latitude/longitude of an incident, from its own fields or its additional_details"""
+    for source in (record, record.get("additional_details") or {}):
+        if not isinstance(source, dict):
+            continue
+        lat = source.get("latitude", source.get("lat"))
+        lng = source.get("longitude", source.get("lng", source.get("lon")))
+        if lat is not None and lng is not None:
+            try:
+                return float(lat), float(lng)
+            except (TypeError, ValueError):
+                pass
+    return None, None
+
+
+class IncidentStore:
+    """Append-only incident log in SQLite (WAL mode) with group commit.
+
+    Appends from any thread are queued to one writer thread, which inserts
+    whatever has accumulated (up to `batch_size`) in a single transaction,
+    so concurrent loggers share one fsync instead of rewriting a file each.
+    Ids come from an AUTOINCREMENT key and are never reused. Readers use
+    their own per-thread connections and are not blocked by the writer.
+    """
+
+    def __init__(self, path=INCIDENTS_DB, batch_size: int = None, flush_interval: float = None,
+                 legacy_json=LEGACY_INCIDENTS_JSON):
+        self.path = Path(path)
+        self.batch_size = batch_size or config.INCIDENT_BATCH_SIZE
+        self.flush_interval = config.INCIDENT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._closed = False
+        self._listeners = []
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        if legacy_json is not None:
+            self._import_legacy(Path(legacy_json))
+
+        self._start_writer()
+        # A forked worker inherits neither the writer thread nor usable connections
+        os.register_at_fork(after_in_child=self._start_writer)
+
+    def _start_writer(self):
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        if self._closed:
+            return
+        self._writer = threading.Thread(target=self._write_loop, name="incident-writer", daemon=True)
+        self._writer.start()
+
+    def subscribe(self, callback):
+        """Call callback(records) from the writer thread after each committed batch"""
+        self._listeners.append(callback)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        # One WAL fsync per committed batch
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _import_legacy(self, json_path: Path):
+        """Carry records over from the old incidents.json once, keeping their 1-based ids"""
+        if not json_path.exists():
+            return
+        with self._connect() as conn:
+            # Take the write lock before checking, so of several processes starting together only
+            # the first imports and the others then see a non-empty table
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM incidents LIMIT 1").fetchone() is not None:
+                return
+            records = json.loads(json_path.read_text() or "[]")
+            conn.executemany(INSERT, [self._row(record, incident_id=i)
+                                      for i, record in enumerate(records, start=1)])
+        if records:
+            logger.info(f"Imported {len(records)} incidents from {json_path}")
+
+    @staticmethod
+    def _row(record: Dict[str, Any], incident_id: int = None) -> tuple:
+        lat, lng = incident_coordinates(record)
+        return (incident_id, record["timestamp"], record.get("description"), record.get("location"),
+                record.get("severity"), lat, lng, json.dumps(record))
+
+    def append(self, record: Dict[str, Any], timeout: float = None) -> int:
+        """Store an incident and return its id once the batch holding it is committed"""
+        if self._closed:
+            raise RuntimeError("Incident store is closed")
+        record = dict(record)
+        record.setdefault("timestamp", datetime.now().isoformat())
+        future = Future()
+        with INCIDENT_APPEND_SECONDS.time():
+            self._queue.put((record, future))
+            return future.result(timeout)
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Give concurrent appends a moment to join this commit
+            try:
+                while len(batch) < self.batch_size:
+                    item = self._queue.get(timeout=self.flush_interval)
+                    if item is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch):
+        try:
+            with INCIDENT_COMMIT_SECONDS.time(), conn:
+                ids = [conn.execute(INSERT, self._row(record)).lastrowid for record, _ in batch]
+        except Exception as e:
+            logger.error(f"Failed to commit {len(batch)} incidents: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), incident_id in zip(batch, ids):
+            future.set_result(incident_id)
+        committed = [{**record, "incident_id": incident_id} for (record, _), incident_id in zip(batch, ids)]
+        for listener in self._listeners:
+            try:
+                listener(committed)
+            except Exception:
+                logger.exception("Incident listener failed")
+
+    def get(self, incident_id: int) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute("SELECT * FROM incidents WHERE id = ?", (incident_id,)).fetchone()
+        return None if row is None else self._record(row)
+
+    def query(self, since: str = None, until: str = None, location: str = None,
+              bbox: Tuple[float, float, float, float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest incidents first, filtered by ISO time range [since, until), exact location or
+        a (min_lat, min_lng, max_lat, max_lng) bounding box"""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if location is not None:
+            clauses.append("location = ?")
+            params.append(location)
+        if bbox is not None:
+            clauses.append("latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?")
+            params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(f"SELECT * FROM incidents {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                      (*params, limit)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def iter_after(self, after_id: int = 0, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Every incident with an id above `after_id`, in id order"""
+        while True:
+            rows = self._reader().execute("SELECT * FROM incidents WHERE id > ? ORDER BY id LIMIT ?",
+                                          (after_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._record(row)
+            after_id = rows[-1]["id"]
+
+    def count(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = json.loads(row["data"])
+        record["incident_id"] = row["id"]
+        return record
+
+    def close(self):
+        """Commit what is queued and stop the writer"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._writer.join()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_incident_store() -> IncidentStore:
+    """Process-wide incident store used when none is injected explicitly"""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                _default_store = IncidentStore()
+    return _default_store
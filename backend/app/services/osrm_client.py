@@ -0,0 +1,82 @@
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app import config
+from app.utils.cache import TTLCache
+from app.utils.metrics import OSRM_CACHE_HITS, OSRM_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Everything on_route_request needs: alternatives with full GeoJSON geometry, steps and node annotations
+ROUTE_PARAMS = {
+    "alternatives": "true",
+    "overview": "full",
+    "geometries": "geojson",
+    "steps": "true",
+    "annotations": "true"
+}
+
+
+class OSRMClient:
+    """OSRM HTTP client with a pooled session, timeouts, retries and a route response cache"""
+
+    def __init__(self, base_url: str = None, profile: str = None, timeout=None, retries: int = None,
+                 pool_size: int = None, cache: Optional[TTLCache] = None, precision: int = None):
+        self.base_url = (base_url or config.OSRM_BASE_URL).rstrip('/')
+        self.profile = profile or config.OSRM_PROFILE
+        self.timeout = timeout or (config.OSRM_CONNECT_TIMEOUT, config.OSRM_READ_TIMEOUT)
+        self.precision = config.OSRM_COORD_PRECISION if precision is None else precision
+        self.cache = cache if cache is not None else TTLCache(config.OSRM_CACHE_SIZE, config.OSRM_CACHE_TTL)
+
+        retry = Retry(
+            total=config.OSRM_RETRIES if retries is None else retries,
+            backoff_factor=0.2,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"])
+        )
+        pool_size = pool_size or config.OSRM_POOL_SIZE
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float,
+              **params) -> Dict[str, Any]:
+        """Fetch routes between two points, serving repeated trips from the cache.
+
+        Coordinates are rounded to `precision` decimals before both the lookup
+        and the request, so a cached response is exactly what OSRM would have
+        returned. The returned dict is shared with the cache; do not mutate it.
+        """
+        start = (round(float(start_lat), self.precision), round(float(start_lng), self.precision))
+        end = (round(float(end_lat), self.precision), round(float(end_lng), self.precision))
+        query = {**ROUTE_PARAMS, **params}
+        key = (self.profile, start, end, tuple(sorted(query.items())))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            OSRM_CACHE_HITS.inc()
+            return cached
+
+        url = f"{self.base_url}/route/v1/{self.profile}/{start[1]},{start[0]};{end[1]},{end[0]}"
+        logger.debug("Calling OSRM API: %s", url)
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, params=query, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            OSRM_REQUEST_SECONDS.labels("error").observe(time.perf_counter() - started)
+            raise
+        OSRM_REQUEST_SECONDS.labels(data.get('code', 'unknown')).observe(time.perf_counter() - started)
+        if data.get('code') == 'Ok':
+            self.cache.set(key, data)
+        return data
+
+    def close(self):
+        self.session.close()
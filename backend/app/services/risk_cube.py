@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.services.array_cache import cli_parser, load_array, load_or_build, save_array
+from app.services.crime_data import CRIMES_CSV
+from app.services.risk_scoring import PointRisk, risk_codes
+from app.utils.geo import METERS_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 7 * 24
+
+
+def hour_of_week(departure_time: Union[str, int, float, datetime]) -> int:
+    """Hour of the week (0 = Monday 00:00-01:00) of a departure time in the crime data's local time.
+
+    Accepts "now", an ISO 8601 string or datetime (naive ones are taken as
+    local time already), or Unix seconds as a number or numeric string.
+    """
+    tz = ZoneInfo(config.CRIME_TIMEZONE)
+    if isinstance(departure_time, str) and departure_time.lstrip("-").replace(".", "", 1).isdigit():
+        departure_time = float(departure_time)  # Unix seconds from a query string
+    if isinstance(departure_time, str) and departure_time.lower() == "now":
+        moment = datetime.now(tz)
+    elif isinstance(departure_time, (int, float)) and not isinstance(departure_time, bool):
+        moment = datetime.fromtimestamp(departure_time, timezone.utc).astimezone(tz)
+    elif isinstance(departure_time, datetime):
+        moment = departure_time
+    elif isinstance(departure_time, str):
+        moment = datetime.fromisoformat(departure_time.replace("Z", "+00:00"))
+    else:
+        raise ValueError(f"Invalid departure_time: {departure_time!r}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(tz)
+    return moment.weekday() * 24 + moment.hour
+
+
+class RiskCube:
+    """How crime risk near each place varies over the week, as a dense (hour-of-week, row, col) array.
+
+    Hourly counts per fine grid cell are far too sparse to average, so the
+    cube is coarse (`resolution_m` cells, pooled over `window_h` hours either
+    side) and stores a multiplier rather than a risk: each cell's mean
+    risk_factor at that hour over its all-week mean, shrunk towards 1 by
+    n / (n + prior_count) where few crimes back it. Scaling the fine-grained
+    risk of a point by its factor keeps the risk grid's spatial detail while
+    adding the time of day. Factors are float16, and selecting an hour is a
+    view of one contiguous slice.
+    """
+
+    def __init__(self, factors: np.ndarray, lat0: float, lng0: float, lat_step: float, lng_step: float,
+                 resolution_m: float, source=None):
+        self.factors = factors
+        self.lat0 = lat0
+        self.lng0 = lng0
+        self.lat_step = lat_step
+        self.lng_step = lng_step
+        self.resolution_m = resolution_m
+        self.source = source
+
+    @property
+    def shape(self):
+        return self.factors.shape
+
+    @classmethod
+    def build(cls, frame: pd.DataFrame, resolution_m: float = None, window_h: int = None,
+              prior_count: float = None) -> "RiskCube":
+        """Aggregate crimes by coarse cell and hour of the week"""
+        resolution_m = resolution_m or config.RISK_CUBE_RESOLUTION_M
+        window_h = config.RISK_CUBE_WINDOW_H if window_h is None else window_h
+        prior_count = config.RISK_CUBE_PRIOR_COUNT if prior_count is None else prior_count
+        lat = frame['Latitude'].to_numpy(dtype=np.float64)
+        lng = frame['Longitude'].to_numpy(dtype=np.float64)
+        risk = frame['risk_factor'].to_numpy(dtype=np.float64)
+        dates = frame['Date'].dt
+        hours = (dates.dayofweek.to_numpy() * 24 + dates.hour.to_numpy()).astype(np.intp)
+
+        mid_lat = (lat.min() + lat.max()) / 2 if len(lat) else 0.0
+        lat_step = resolution_m / METERS_PER_DEGREE
+        lng_step = lat_step / np.cos(np.radians(mid_lat))
+        lat0 = lat.min() if len(lat) else 0.0
+        lng0 = lng.min() if len(lng) else 0.0
+        rows = np.floor((lat - lat0) / lat_step).astype(np.intp)
+        cols = np.floor((lng - lng0) / lng_step).astype(np.intp)
+        n_rows = rows.max() + 1 if len(rows) else 1
+        n_cols = cols.max() + 1 if len(cols) else 1
+
+        n_cells = n_rows * n_cols
+        flat = hours * n_cells + rows * n_cols + cols
+        sums = np.bincount(flat, weights=risk, minlength=HOURS_PER_WEEK * n_cells).reshape(HOURS_PER_WEEK, n_cells)
+        counts = np.bincount(flat, minlength=HOURS_PER_WEEK * n_cells).reshape(HOURS_PER_WEEK, n_cells)
+        # Pool neighbouring hours, wrapping from Sunday night into Monday morning
+        window_sums = sum(np.roll(sums, shift, axis=0) for shift in range(-window_h, window_h + 1))
+        window_counts = sum(np.roll(counts, shift, axis=0) for shift in range(-window_h, window_h + 1))
+
+        week_counts = counts.sum(axis=0)
+        week_mean = np.divide(sums.sum(axis=0), week_counts, out=np.zeros(n_cells), where=week_counts > 0)
+        hour_mean = np.divide(window_sums, window_counts, out=np.zeros(window_sums.shape), where=window_counts > 0)
+        ratio = np.divide(hour_mean, week_mean, out=np.ones(window_sums.shape), where=week_mean > 0)
+        factors = 1.0 + (ratio - 1.0) * window_counts / (window_counts + prior_count)
+        return cls(factors.reshape(HOURS_PER_WEEK, n_rows, n_cols).astype(np.float16),
+                   float(lat0), float(lng0), float(lat_step), float(lng_step), float(resolution_m))
+
+    def slice(self, hour: int) -> np.ndarray:
+        """(rows, cols) factors for one hour of the week"""
+        return self.factors[hour % HOURS_PER_WEEK]
+
+    def factor(self, lat, lng, hour: int) -> np.ndarray:
+        """Risk multiplier at each coordinate for an hour of the week; 1 outside the cube"""
+        hour_factors = self.slice(hour)
+        rows = np.floor((np.asarray(lat, dtype=np.float64) - self.lat0) / self.lat_step).astype(np.intp)
+        cols = np.floor((np.asarray(lng, dtype=np.float64) - self.lng0) / self.lng_step).astype(np.intp)
+        valid = (rows >= 0) & (rows < self.shape[1]) & (cols >= 0) & (cols < self.shape[2])
+        factors = hour_factors[np.where(valid, rows, 0), np.where(valid, cols, 0)].astype(np.float64)
+        return np.where(valid, factors, 1.0)
+
+    def adjust(self, risk: PointRisk, lat, lng, hour: int) -> PointRisk:
+        """Scale point risk to an hour of the week and re-bucket its levels"""
+        avg_risk = risk.avg_risk * self.factor(lat, lng, hour)
+        return PointRisk(risk_codes(avg_risk), avg_risk)
+
+    def save(self, path, source=None):
+        """Write the factors as a .npy file with a JSON sidecar describing the raster"""
+        save_array(path, self.factors, {
+            "lat0": self.lat0,
+            "lng0": self.lng0,
+            "lat_step": self.lat_step,
+            "lng_step": self.lng_step,
+            "resolution_m": self.resolution_m,
+            "shape": list(self.shape),
+            "source": source
+        })
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "RiskCube":
+        """Load a saved cube, memory-mapped read-only so workers share its pages"""
+        factors, meta = load_array(path, mmap)
+        return cls(factors, meta["lat0"], meta["lng0"], meta["lat_step"], meta["lng_step"],
+                   meta["resolution_m"], source=meta.get("source"))
+
+
+def cube_path(resolution_m: float, window_h: int, prior_count: float, cache_dir=None) -> Path:
+    cache_dir = Path(cache_dir or config.CACHE_DIR)
+    return cache_dir / f"risk_cube_{resolution_m:g}m_w{window_h}_p{prior_count:g}.npy"
+
+
+def load_or_build_risk_cube(load_frame: Callable[[], pd.DataFrame], resolution_m: float = None,
+                            cache_dir=None, csv_path=CRIMES_CSV, window_h: int = None,
+                            prior_count: float = None) -> RiskCube:
+    """Map the cached cube for these settings, rebuilding it from load_frame() when the crime CSV changed"""
+    resolution_m = resolution_m or config.RISK_CUBE_RESOLUTION_M
+    window_h = config.RISK_CUBE_WINDOW_H if window_h is None else window_h
+    prior_count = config.RISK_CUBE_PRIOR_COUNT if prior_count is None else prior_count
+    path = cube_path(resolution_m, window_h, prior_count, cache_dir)
+
+    def build() -> RiskCube:
+        cube = RiskCube.build(load_frame(), resolution_m, window_h, prior_count)
+        logger.info(f"Built {'x'.join(map(str, cube.shape))} hour-of-week risk cube at {resolution_m}m into {path}")
+        return cube
+
+    return load_or_build(path, csv_path, build, RiskCube.load, "Risk cube")
+
+
+if __name__ == "__main__":
+    from app.services.dataset import CrimeDataset
+
+    parser = cli_parser("Aggregate the crime dataset by place and hour of the week", config.RISK_CUBE_RESOLUTION_M)
+    parser.add_argument("--window-h", type=int, default=config.RISK_CUBE_WINDOW_H)
+    parser.add_argument("--prior-count", type=float, default=config.RISK_CUBE_PRIOR_COUNT)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    built = load_or_build_risk_cube(lambda: CrimeDataset(cache_dir=args.cache_dir).frame, args.resolution_m,
+                                    args.cache_dir, window_h=args.window_h, prior_count=args.prior_count)
+    print(f"Risk cube {'x'.join(map(str, built.shape))} at {built.resolution_m}m ready")
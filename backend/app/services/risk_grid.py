@@ -0,0 +1,190 @@
+import logging
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.services.array_cache import cli_parser, load_array, load_or_build, save_array
+from app.services.crime_data import CRIMES_CSV
+from app.services.risk_scoring import PointRisk, risk_codes
+from app.utils.geo import METERS_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+GRID_DTYPE = np.dtype([('mean_risk', '<f4'), ('count', '<u4'), ('risk_level', 'u1')])
+
+
+class RiskGrid:
+    """Fixed-resolution lat/lng raster of crime risk with O(1) point lookup.
+
+    Each cell aggregates every crime in a square window of cells with the
+    same area as a `radius_m` disc, so looking up the cell containing a
+    coordinate approximates the radius query NavigationNamespace used to
+    run, to within the cell size.
+    """
+
+    def __init__(self, cells: np.ndarray, lat0: float, lng0: float, lat_step: float, lng_step: float,
+                 resolution_m: float, radius_m: float, source=None, incidents_through: int = 0, path=None):
+        self.cells = cells
+        self.lat0 = lat0
+        self.lng0 = lng0
+        self.lat_step = lat_step
+        self.lng_step = lng_step
+        self.resolution_m = resolution_m
+        self.radius_m = radius_m
+        # Crime CSV the grid was built from, and the last logged incident folded in since
+        self.source = source
+        self.incidents_through = incidents_through
+        self.path = path
+
+    @property
+    def shape(self):
+        return self.cells.shape
+
+    @classmethod
+    def build(cls, lat, lng, risk, resolution_m: float = None, radius_m: float = None) -> "RiskGrid":
+        """Rasterize crime points into a grid of `resolution_m` cells"""
+        resolution_m = resolution_m or config.RISK_GRID_RESOLUTION_M
+        radius_m = config.RISK_RADIUS_M if radius_m is None else radius_m
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        risk = np.asarray(risk, dtype=np.float64)
+
+        half = _window_half(radius_m, resolution_m)
+        mid_lat = (lat.min() + lat.max()) / 2 if len(lat) else 0.0
+        lat_step = resolution_m / METERS_PER_DEGREE
+        lng_step = lat_step / np.cos(np.radians(mid_lat))
+        lat0 = (lat.min() if len(lat) else 0.0) - half * lat_step
+        lng0 = (lng.min() if len(lng) else 0.0) - half * lng_step
+
+        rows = np.floor((lat - lat0) / lat_step).astype(np.intp)
+        cols = np.floor((lng - lng0) / lng_step).astype(np.intp)
+        n_rows = (rows.max() + 1 if len(rows) else 1) + half
+        n_cols = (cols.max() + 1 if len(cols) else 1) + half
+
+        flat = rows * n_cols + cols
+        sums = np.bincount(flat, weights=risk, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+        counts = np.bincount(flat, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+        window_sums = _box_sum(sums, half)
+        window_counts = _box_sum(counts, half)
+
+        mean_risk = np.full(window_sums.shape, np.nan)
+        np.divide(window_sums, window_counts, out=mean_risk, where=window_counts > 0)
+
+        cells = np.empty((n_rows, n_cols), dtype=GRID_DTYPE)
+        cells['mean_risk'] = mean_risk
+        cells['count'] = window_counts
+        cells['risk_level'] = risk_codes(mean_risk)
+        return cls(cells, float(lat0), float(lng0), float(lat_step), float(lng_step),
+                   float(resolution_m), float(radius_m))
+
+    def cell_index(self, lat, lng):
+        """Row and column of the cells containing each coordinate, plus an in-bounds mask"""
+        rows = np.floor((np.asarray(lat, dtype=np.float64) - self.lat0) / self.lat_step).astype(np.intp)
+        cols = np.floor((np.asarray(lng, dtype=np.float64) - self.lng0) / self.lng_step).astype(np.intp)
+        valid = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return np.where(valid, rows, 0), np.where(valid, cols, 0), valid
+
+    def lookup(self, lat, lng) -> PointRisk:
+        """Risk for arrays of coordinates; points outside the grid score as Low"""
+        rows, cols, valid = self.cell_index(lat, lng)
+        cells = self.cells[rows, cols]
+        levels = np.where(valid, cells['risk_level'], 0).astype(np.uint8)
+        avg_risk = np.where(valid, cells['mean_risk'], np.nan).astype(np.float64)
+        return PointRisk(levels, avg_risk)
+
+    def add_points(self, lat, lng, risk) -> int:
+        """Fold new crimes into the grid, updating only the cells whose window covers them.
+
+        A loaded grid switches to a copy-on-write mapping first, so only the
+        pages touched here stop being shared. Points outside the raster are
+        skipped. Returns how many cells changed.
+        """
+        if not self.cells.flags.writeable:
+            self.cells = np.load(self.path, mmap_mode='c') if self.path is not None else self.cells.copy()
+        half = _window_half(self.radius_m, self.resolution_m)
+        rows, cols, valid = self.cell_index(lat, lng)
+        risk = np.broadcast_to(np.asarray(risk, dtype=np.float64), valid.shape)
+        changed = 0
+        for row, col, value in zip(rows[valid], cols[valid], risk[valid]):
+            window = self.cells[max(row - half, 0):row + half + 1, max(col - half, 0):col + half + 1]
+            counts = window['count'].astype(np.float64)
+            sums = np.nan_to_num(window['mean_risk'].astype(np.float64)) * counts + value
+            counts += 1
+            window['mean_risk'] = sums / counts
+            window['count'] = counts
+            window['risk_level'] = risk_codes(sums / counts)
+            changed += window.size
+        return changed
+
+    def save(self, path, source=None, incidents_through: int = None):
+        """Write the cells as a .npy file with a JSON sidecar describing the raster"""
+        save_array(path, self.cells, {
+            "lat0": self.lat0,
+            "lng0": self.lng0,
+            "lat_step": self.lat_step,
+            "lng_step": self.lng_step,
+            "resolution_m": self.resolution_m,
+            "radius_m": self.radius_m,
+            "shape": list(self.shape),
+            "source": source,
+            "incidents_through": self.incidents_through if incidents_through is None else incidents_through
+        })
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "RiskGrid":
+        """Load a saved grid, memory-mapped read-only so workers share its pages"""
+        cells, meta = load_array(path, mmap)
+        return cls(cells, meta["lat0"], meta["lng0"], meta["lat_step"], meta["lng_step"],
+                   meta["resolution_m"], meta["radius_m"], source=meta.get("source"),
+                   incidents_through=meta.get("incidents_through", 0), path=Path(path))
+
+
+def _window_half(radius_m: float, resolution_m: float) -> int:
+    """Window half-width in cells whose square has the same area as the scoring disc"""
+    return max(0, int(round((np.sqrt(np.pi) * radius_m / resolution_m - 1) / 2)))
+
+
+def _box_sum(values: np.ndarray, half: int) -> np.ndarray:
+    """Sum of each cell's (2 * half + 1)^2 neighbourhood via a summed-area table"""
+    size = 2 * half + 1
+    table = np.zeros((values.shape[0] + size, values.shape[1] + size))
+    table[half + 1:values.shape[0] + half + 1, half + 1:values.shape[1] + half + 1] = values
+    table = table.cumsum(axis=0).cumsum(axis=1)
+    return table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+
+
+def grid_path(resolution_m: float, radius_m: float, cache_dir=None) -> Path:
+    cache_dir = Path(cache_dir or config.CACHE_DIR)
+    return cache_dir / f"risk_grid_{resolution_m:g}m_r{radius_m:g}m.npy"
+
+
+def load_or_build_risk_grid(load_frame: Callable[[], pd.DataFrame], resolution_m: float = None,
+                            radius_m: float = None, cache_dir=None, csv_path=CRIMES_CSV) -> RiskGrid:
+    """Map the cached grid for this resolution, rebuilding it from load_frame() when the crime CSV changed"""
+    resolution_m = resolution_m or config.RISK_GRID_RESOLUTION_M
+    radius_m = config.RISK_RADIUS_M if radius_m is None else radius_m
+    path = grid_path(resolution_m, radius_m, cache_dir)
+
+    def build() -> RiskGrid:
+        df = load_frame()
+        grid = RiskGrid.build(df['Latitude'], df['Longitude'], df['risk_factor'], resolution_m, radius_m)
+        logger.info(f"Built {grid.shape[0]}x{grid.shape[1]} risk grid at {resolution_m}m resolution into {path}")
+        return grid
+
+    return load_or_build(path, csv_path, build, RiskGrid.load, "Risk grid")
+
+
+if __name__ == "__main__":
+    from app.services.dataset import CrimeDataset
+
+    parser = cli_parser("Rasterize the crime dataset into a risk grid", config.RISK_GRID_RESOLUTION_M)
+    parser.add_argument("--radius-m", type=float, default=config.RISK_RADIUS_M)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    built = load_or_build_risk_grid(lambda: CrimeDataset(cache_dir=args.cache_dir).frame, args.resolution_m,
+                                    args.radius_m, args.cache_dir)
+    print(f"Risk grid {built.shape[0]}x{built.shape[1]} at {built.resolution_m}m ready")
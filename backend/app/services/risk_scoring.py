@@ -0,0 +1,113 @@
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from app.services.crime_store import CrimePointStore
+
+# Risk level codes; the order doubles as severity so arrays can be compared
+RISK_LEVELS = ("Low", "Medium", "High")
+LOW, MEDIUM, HIGH = 0, 1, 2
+
+HIGH_RISK_THRESHOLD = 7
+MEDIUM_RISK_THRESHOLD = 4
+
+
+class PointRisk(NamedTuple):
+    levels: np.ndarray  # uint8 risk level codes, one per point
+    avg_risk: np.ndarray  # mean nearby risk_factor per point, NaN where nothing is nearby
+
+
+def risk_codes(avg_risk) -> np.ndarray:
+    """Bucket average risk factors into level codes; NaN buckets as Low"""
+    avg_risk = np.asarray(avg_risk, dtype=np.float64)
+    codes = np.full(avg_risk.shape, LOW, dtype=np.uint8)
+    codes[avg_risk >= MEDIUM_RISK_THRESHOLD] = MEDIUM
+    codes[avg_risk >= HIGH_RISK_THRESHOLD] = HIGH
+    return codes
+
+
+def level_names(codes) -> np.ndarray:
+    """Map level codes back to their 'Low'/'Medium'/'High' names"""
+    return np.asarray(RISK_LEVELS, dtype=object)[np.asarray(codes, dtype=np.intp)]
+
+
+def _dominant(counts: np.ndarray) -> np.ndarray:
+    """Most common level per row of counts, ties resolved towards the higher level"""
+    dominant = HIGH - np.argmax(counts[..., ::-1], axis=-1)
+    return np.where(counts.sum(axis=-1) == 0, LOW, dominant)
+
+
+def dominant_risk(codes) -> str:
+    """Most common risk level among the given codes"""
+    counts = np.bincount(np.asarray(codes, dtype=np.intp), minlength=len(RISK_LEVELS))
+    return RISK_LEVELS[int(_dominant(counts))]
+
+
+def segment_dominant_risk(codes, lengths) -> np.ndarray:
+    """Dominant level code for each consecutive run of `lengths` codes"""
+    lengths = np.asarray(lengths, dtype=np.intp)
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+    counts = np.bincount(segment_ids * len(RISK_LEVELS) + np.asarray(codes, dtype=np.intp),
+                         minlength=len(lengths) * len(RISK_LEVELS))
+    return _dominant(counts.reshape(len(lengths), len(RISK_LEVELS))).astype(np.uint8)
+
+
+def risk_summary(codes) -> Dict[str, object]:
+    """Percentage of points at each level plus the dominant level"""
+    codes = np.asarray(codes, dtype=np.intp)
+    total_points = len(codes)
+    if total_points == 0:
+        return {
+            "high_risk_percentage": 0,
+            "medium_risk_percentage": 0,
+            "low_risk_percentage": 0,
+            "dominant_risk": "Low"
+        }
+
+    counts = np.bincount(codes, minlength=len(RISK_LEVELS))
+    return {
+        "high_risk_percentage": round(int(counts[HIGH]) / total_points * 100, 1),
+        "medium_risk_percentage": round(int(counts[MEDIUM]) / total_points * 100, 1),
+        "low_risk_percentage": round(int(counts[LOW]) / total_points * 100, 1),
+        "dominant_risk": RISK_LEVELS[int(_dominant(counts))]
+    }
+
+
+class RiskScorer:
+    """Scores whole coordinate arrays against the crime point store in one pass"""
+
+    def __init__(self, store: CrimePointStore, radius_m: float = 50, grid=None, incidents=None):
+        self.store = store
+        self.radius_m = radius_m
+        # Optional RiskGrid answering lookups at its own radius by array index
+        self.grid = grid
+        # Optional IncidentLayer of crimes logged since the store was built
+        self.incidents = incidents
+        self.risk_factors = store.df['risk_factor'].to_numpy(dtype=np.float64)
+
+    def score(self, coords, radius_m: float = None) -> PointRisk:
+        """Risk for an (N, 2) array of [lng, lat] pairs, GeoJSON order as OSRM returns them"""
+        radius_m = self.radius_m if radius_m is None else radius_m
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if len(coords) == 0:
+            return PointRisk(np.empty(0, dtype=np.uint8), np.empty(0))
+        if self.grid is not None and radius_m == self.grid.radius_m:
+            return self.grid.lookup(coords[:, 1], coords[:, 0])
+
+        # Consecutive steps and alternative routes share many vertices
+        unique, inverse = np.unique(coords, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        matches = self.store.query_radius_batch(unique[:, 1], unique[:, 0], radius_m)
+        counts = np.fromiter((len(m) for m in matches), dtype=np.intp, count=len(matches))
+        owners = np.repeat(np.arange(len(unique)), counts)
+        sums = np.bincount(owners, weights=self.risk_factors[np.concatenate(matches)],
+                           minlength=len(unique))
+        if self.incidents is not None and len(self.incidents):
+            incident_sums, incident_counts = self.incidents.radius_sums(unique[:, 1], unique[:, 0], radius_m)
+            sums = sums + incident_sums
+            counts = counts + incident_counts
+
+        avg_risk = np.full(len(unique), np.nan)
+        np.divide(sums, counts, out=avg_risk, where=counts > 0)
+        return PointRisk(risk_codes(avg_risk)[inverse], avg_risk[inverse])
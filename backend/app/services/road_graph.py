@@ -0,0 +1,252 @@
+import argparse
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from app import config
+from app.services.crime_data import source_signature
+from app.utils.geo import haversine_m, to_unit_vectors
+
+try:
+    import osmium
+except ImportError:  # osmium is optional; only needed to read .osm.pbf extracts
+    osmium = None
+
+logger = logging.getLogger(__name__)
+
+# Road types each profile may use, with a typical speed in m/s for duration estimates
+PROFILE_SPEEDS = {
+    "driving": {
+        "motorway": 27.0, "motorway_link": 18.0, "trunk": 22.0, "trunk_link": 15.0,
+        "primary": 15.0, "primary_link": 12.0, "secondary": 13.0, "secondary_link": 11.0,
+        "tertiary": 11.0, "tertiary_link": 9.0, "unclassified": 9.0, "residential": 8.0,
+        "living_street": 4.0, "service": 5.0, "road": 8.0
+    },
+    "walking": {
+        highway: 1.4 for highway in (
+            "primary", "primary_link", "secondary", "secondary_link", "tertiary", "tertiary_link",
+            "unclassified", "residential", "living_street", "service", "road", "pedestrian",
+            "footway", "path", "steps", "track", "cycleway"
+        )
+    }
+}
+ONEWAY_VALUES = {"yes", "1", "true"}
+
+
+class OSMWay(NamedTuple):
+    nodes: List[Tuple[int, float, float]]  # (OSM node id, lat, lng) in way order
+    name: str
+    highway: str
+    oneway: str
+
+
+def read_osm_ways(path, profile: str = "driving") -> Iterator[OSMWay]:
+    """Routable ways of an OSM extract (.osm XML, or .osm.pbf when osmium is installed)"""
+    allowed = PROFILE_SPEEDS[profile]
+    path = Path(path)
+    if path.suffix == ".pbf":
+        yield from _read_pbf_ways(path, allowed)
+        return
+
+    coords: Dict[int, Tuple[float, float]] = {}
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+            if tags.get("highway") in allowed:
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                nodes = [(ref, *coords[ref]) for ref in refs if ref in coords]
+                if len(nodes) >= 2:
+                    yield OSMWay(nodes, tags.get("name", ""), tags["highway"], tags.get("oneway", ""))
+            elem.clear()
+
+
+def _read_pbf_ways(path: Path, allowed) -> Iterator[OSMWay]:
+    if osmium is None:
+        raise RuntimeError("Reading .osm.pbf extracts requires the osmium package; "
+                           "install it or convert the extract to .osm XML")
+    ways = []
+
+    class WayHandler(osmium.SimpleHandler):
+        def way(self, w):
+            highway = w.tags.get("highway")
+            if highway in allowed:
+                nodes = [(n.ref, n.location.lat, n.location.lon) for n in w.nodes if n.location.valid()]
+                if len(nodes) >= 2:
+                    ways.append(OSMWay(nodes, w.tags.get("name", ""), highway, w.tags.get("oneway", "")))
+
+    WayHandler().apply_file(str(path), locations=True)
+    yield from ways
+
+
+class RoadGraph:
+    """Directed road network in compressed sparse row form.
+
+    Nodes carry their OSM ids and coordinates; edge i runs from the node
+    whose CSR row holds it to `targets[i]`, with its length, typical speed,
+    road name and the precomputed crime risk around it (mean nearby
+    risk_factor, 0 where nothing was recorded).
+    """
+
+    ARRAYS = ("node_ids", "lat", "lng", "indptr", "targets", "length_m", "speed_mps", "risk", "name_ids")
+
+    def __init__(self, node_ids, lat, lng, indptr, targets, length_m, speed_mps, risk, name_ids, names,
+                 profile: str = "driving", source=None):
+        self.node_ids = node_ids
+        self.lat = lat
+        self.lng = lng
+        self.indptr = indptr
+        self.targets = targets
+        self.length_m = length_m
+        self.speed_mps = speed_mps
+        self.risk = risk
+        self.name_ids = name_ids
+        self.names = list(names)
+        self.profile = profile
+        self.source = source
+        self._tree = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.targets)
+
+    def edge_sources(self) -> np.ndarray:
+        """Source node of every edge, expanded from the CSR row pointers"""
+        return np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def nearest_node(self, lat: float, lng: float) -> int:
+        if self._tree is None:
+            self._tree = cKDTree(to_unit_vectors(self.lat, self.lng))
+        _, idx = self._tree.query(to_unit_vectors(lat, lng)[0])
+        return int(idx)
+
+    @classmethod
+    def from_ways(cls, ways: Iterator[OSMWay], profile: str = "driving", source=None) -> "RoadGraph":
+        speeds = PROFILE_SPEEDS[profile]
+        node_index: Dict[int, int] = {}
+        node_lat, node_lng = [], []
+        names = [""]
+        name_index = {"": 0}
+        sources, targets, edge_speeds, edge_names = [], [], [], []
+
+        for way in ways:
+            idx = []
+            for osm_id, lat, lng in way.nodes:
+                if osm_id not in node_index:
+                    node_index[osm_id] = len(node_lat)
+                    node_lat.append(lat)
+                    node_lng.append(lng)
+                idx.append(node_index[osm_id])
+            if way.name not in name_index:
+                name_index[way.name] = len(names)
+                names.append(way.name)
+
+            forward = backward = True
+            if profile == "driving":
+                if way.oneway in ONEWAY_VALUES or (way.highway == "motorway" and way.oneway != "no"):
+                    backward = False
+                elif way.oneway == "-1":
+                    forward = False
+            for u, v in zip(idx[:-1], idx[1:]):
+                for a, b, use in ((u, v, forward), (v, u, backward)):
+                    if use and a != b:
+                        sources.append(a)
+                        targets.append(b)
+                        edge_speeds.append(speeds[way.highway])
+                        edge_names.append(name_index[way.name])
+
+        lat = np.asarray(node_lat, dtype=np.float64)
+        lng = np.asarray(node_lng, dtype=np.float64)
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        order = np.argsort(sources, kind="stable")
+        sources, targets = sources[order], targets[order]
+        indptr = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(lat)), out=indptr[1:])
+
+        node_ids = np.empty(len(lat), dtype=np.int64)
+        for osm_id, i in node_index.items():
+            node_ids[i] = osm_id
+        return cls(node_ids, lat, lng, indptr, targets,
+                   haversine_m(lat[sources], lng[sources], lat[targets], lng[targets]).astype(np.float32),
+                   np.asarray(edge_speeds, dtype=np.float32)[order],
+                   np.zeros(len(targets), dtype=np.float32),
+                   np.asarray(edge_names, dtype=np.int32)[order],
+                   names, profile, source)
+
+    def score_edges(self, scorer):
+        """Precompute each edge's risk as the scorer's mean risk factor around its midpoint"""
+        sources = self.edge_sources()
+        mid_lat = (self.lat[sources] + self.lat[self.targets]) / 2
+        mid_lng = (self.lng[sources] + self.lng[self.targets]) / 2
+        risk = scorer.score(np.column_stack((mid_lng, mid_lat)))
+        self.risk = np.nan_to_num(risk.avg_risk).astype(np.float32)
+
+    def save(self, path):
+        """Write all arrays to one .npz file, replacing any previous graph atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"profile": self.profile, "source": self.source, "names": self.names}
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, meta=np.array(json.dumps(meta)),
+                 **{name: getattr(self, name) for name in self.ARRAYS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path) -> "RoadGraph":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in cls.ARRAYS}
+        return cls(**arrays, names=meta["names"], profile=meta["profile"], source=meta["source"])
+
+
+def road_graph_path(profile: str = None, cache_dir=None) -> Path:
+    cache_dir = Path(cache_dir or config.CACHE_DIR)
+    return cache_dir / f"road_graph_{profile or config.ROAD_GRAPH_PROFILE}.npz"
+
+
+def build_road_graph(osm_path, scorer, profile: str = None) -> RoadGraph:
+    """Parse an OSM extract into a RoadGraph with per-edge crime risk"""
+    profile = profile or config.ROAD_GRAPH_PROFILE
+    graph = RoadGraph.from_ways(read_osm_ways(osm_path, profile), profile, source=source_signature(osm_path))
+    graph.score_edges(scorer)
+    return graph
+
+
+def load_road_graph(profile: str = None, cache_dir=None) -> Optional[RoadGraph]:
+    """The prebuilt graph for a profile, or None when none has been built"""
+    path = road_graph_path(profile, cache_dir)
+    if not path.exists():
+        return None
+    return RoadGraph.load(path)
+
+
+if __name__ == "__main__":
+    from app.services.dataset import CrimeDataset
+
+    parser = argparse.ArgumentParser(description="Build the road graph used for safest-route search")
+    parser.add_argument("osm", nargs="?", default=config.OSM_EXTRACT,
+                        help="OSM extract (.osm, or .osm.pbf with osmium installed)")
+    parser.add_argument("--profile", default=config.ROAD_GRAPH_PROFILE, choices=sorted(PROFILE_SPEEDS))
+    parser.add_argument("--cache-dir", default=str(config.CACHE_DIR))
+    args = parser.parse_args()
+    if not args.osm:
+        parser.error("an OSM extract is required (argument or OSM_EXTRACT)")
+
+    logging.basicConfig(level=logging.INFO)
+    dataset = CrimeDataset(cache_dir=args.cache_dir)
+    built = build_road_graph(args.osm, dataset.risk_scorer, args.profile)
+    built.save(road_graph_path(args.profile, args.cache_dir))
+    print(f"Road graph with {built.n_nodes} nodes and {built.n_edges} edges ready")
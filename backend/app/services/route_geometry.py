@@ -0,0 +1,136 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from app.utils.geo import METERS_PER_DEGREE, haversine_m
+
+POLYLINE_PRECISION = 6  # Decimal places kept by encode_polyline, as OSRM's polyline6
+
+
+def simplify_mask(lat: np.ndarray, lng: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker: mask of the vertices to keep so the line stays within tolerance_m of the original.
+
+    Distances are measured on a local equirectangular projection, which is
+    accurate to well under a meter over the length of a route step. The
+    first and last vertices are always kept.
+    """
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n <= 2 or tolerance_m <= 0:
+        return keep
+    keep[1:-1] = False
+    x = np.asarray(lng, dtype=np.float64) * METERS_PER_DEGREE * np.cos(np.radians(np.mean(lat)))
+    y = np.asarray(lat, dtype=np.float64) * METERS_PER_DEGREE
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        px, py = x[start + 1:end], y[start + 1:end]
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        length2 = dx * dx + dy * dy
+        # Distance to the chord as a segment, so closed loops (start == end) still work
+        t = np.clip(((px - x[start]) * dx + (py - y[start]) * dy) / length2, 0.0, 1.0) if length2 else 0.0
+        distances = np.hypot(px - (x[start] + t * dx), py - (y[start] + t * dy))
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def sample_line(coords: np.ndarray, tolerance_m: float, spacing_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Simplify an (N, 2) [lng, lat] line, then add points wherever kept vertices are over spacing_m apart.
+
+    Returns the new points and, for each, the index of the original vertex
+    starting the segment it lies on, so values known per original vertex
+    can be carried over.
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
+        return coords, np.arange(len(coords))
+    lng, lat = coords[:, 0], coords[:, 1]
+    kept = np.flatnonzero(simplify_mask(lat, lng, tolerance_m))
+    if spacing_m <= 0:
+        return coords[kept], kept
+
+    along = np.concatenate(([0.0], np.cumsum(haversine_m(lat[:-1], lng[:-1], lat[1:], lng[1:]))))
+    gaps = np.diff(along[kept])
+    extra = np.maximum(np.ceil(gaps / spacing_m).astype(np.intp) - 1, 0)
+    if not extra.any():
+        return coords[kept], kept
+
+    # Evenly spaced distances along the original line inside each long gap
+    gap = np.repeat(np.arange(len(gaps)), extra)
+    nth = np.arange(len(gap)) - np.repeat(np.cumsum(extra) - extra, extra) + 1
+    positions = along[kept[gap]] + gaps[gap] * nth / (extra[gap] + 1)
+    segment = np.clip(np.searchsorted(along, positions, side='right') - 1, 0, len(coords) - 2)
+    seg_length = along[segment + 1] - along[segment]
+    fraction = np.divide(positions - along[segment], seg_length, out=np.zeros(len(positions)), where=seg_length > 0)
+    samples = np.round(coords[segment] + (coords[segment + 1] - coords[segment]) * fraction[:, None], 6)
+
+    # Kept vertex i is followed by the samples of gap i
+    order = np.argsort(np.concatenate((np.arange(len(kept)) * 2.0, gap * 2.0 + 1)), kind='stable')
+    return np.concatenate((coords[kept], samples))[order], np.concatenate((kept, segment))[order]
+
+
+def sample_route(coords: np.ndarray, step_lengths: np.ndarray, tolerance_m: float,
+                 spacing_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """sample_line applied to each step of a route flattened as coords plus per-step point counts.
+
+    Returns the sampled coords, the new per-step counts, and the index into
+    the original coords behind each sampled point.
+    """
+    sampled, sources, lengths = [], [], []
+    offset = 0
+    for length in np.asarray(step_lengths, dtype=np.intp).tolist():
+        points, source = sample_line(coords[offset:offset + length], tolerance_m, spacing_m)
+        sampled.append(points)
+        sources.append(source + offset)
+        lengths.append(len(points))
+        offset += length
+    if not sampled:
+        return np.empty((0, 2)), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(sampled), np.concatenate(sources), np.asarray(lengths, dtype=np.intp)
+
+
+def encode_polyline(coords, precision: int = POLYLINE_PRECISION) -> str:
+    """Encode (N, 2) [lng, lat] coordinates in the Google encoded polyline format (lat, lng order)"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    values = np.round(coords[:, ::-1] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    chunks = []
+    for value in ((deltas << 1) ^ (deltas >> 63)).tolist():
+        while value >= 0x20:
+            chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Inverse of encode_polyline, returning [lng, lat] pairs"""
+    values = []
+    value = shift = 0
+    for char in encoded:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    latlng = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return latlng[:, ::-1].tolist()
+
+
+def run_length_encode(codes) -> List[List[int]]:
+    """[[value, run length], ...] for consecutive equal values"""
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    runs = np.diff(np.append(starts, len(codes)))
+    return np.column_stack((codes[starts], runs)).tolist()
@@ -0,0 +1,196 @@
+import heapq
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app import config
+from app.services.risk_scoring import HIGH_RISK_THRESHOLD
+from app.services.road_graph import RoadGraph
+from app.utils.cache import TTLCache
+from app.utils.geo import EARTH_RADIUS_M, to_unit_vectors
+
+# Extra cost factor for reusing an earlier route's edges when searching for alternatives,
+# and the shared share of length above which an alternative counts as a duplicate
+ALTERNATIVE_PENALTY = 1.5
+MAX_OVERLAP = 0.8
+
+
+class SafeRouter:
+    """Local shortest-path search over a RoadGraph with risk-weighted edge costs.
+
+    An edge costs length_m * (1 + risk_weight * risk / HIGH_RISK_THRESHOLD),
+    so risk_weight 0 finds the shortest route and larger weights trade
+    distance for avoiding high-crime streets. Searches run A* with the
+    straight-line distance to the target as heuristic, which never
+    overestimates because no edge costs less than its length. Alternatives
+    come from re-running the search with earlier routes' edges penalized.
+    """
+
+    def __init__(self, graph: RoadGraph, risk_weight: float = None, alternatives: int = None):
+        self.graph = graph
+        self.risk_weight = config.SAFE_ROUTE_RISK_WEIGHT if risk_weight is None else risk_weight
+        self.alternatives = alternatives or config.SAFE_ROUTE_ALTERNATIVES
+        # Plain lists index far faster than NumPy arrays inside the search loop
+        self._indptr = graph.indptr.tolist()
+        self._targets = graph.targets.tolist()
+        xyz = to_unit_vectors(graph.lat, graph.lng)
+        self._x, self._y, self._z = xyz[:, 0].tolist(), xyz[:, 1].tolist(), xyz[:, 2].tolist()
+        self._costs = TTLCache(maxsize=4)
+
+    def edge_costs(self, risk_weight: float) -> List[float]:
+        """Cost of every edge at a risk weight, cached for the few weights clients use"""
+        key = round(float(risk_weight), 3)
+        costs = self._costs.get(key)
+        if costs is None:
+            graph = self.graph
+            costs = (graph.length_m.astype(np.float64)
+                     * (1.0 + key * graph.risk.astype(np.float64) / HIGH_RISK_THRESHOLD)).tolist()
+            self._costs.set(key, costs)
+        return costs
+
+    def shortest_path(self, source: int, target: int, costs: List[float],
+                      penalties: Optional[Dict[int, float]] = None) -> Optional[List[int]]:
+        """Edge ids of the cheapest path from source to target, or None if unreachable"""
+        indptr, targets = self._indptr, self._targets
+        x, y, z = self._x, self._y, self._z
+        tx, ty, tz = x[target], y[target], z[target]
+
+        def heuristic(node):
+            return math.sqrt((x[node] - tx) ** 2 + (y[node] - ty) ** 2 + (z[node] - tz) ** 2) * EARTH_RADIUS_M
+
+        best = {source: 0.0}
+        parents = {}
+        closed = set()
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = targets[edge]
+                edge_cost = costs[edge] if penalties is None else costs[edge] * penalties.get(edge, 1.0)
+                new_cost = cost + edge_cost
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    parents[neighbor] = (node, edge)
+                    heapq.heappush(heap, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        else:
+            return None
+
+        edges = []
+        node = target
+        while node != source:
+            node, edge = parents[node]
+            edges.append(edge)
+        return edges[::-1]
+
+    def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float,
+              risk_weight: float = None, alternatives: int = None) -> Dict[str, Any]:
+        """Up to `alternatives` distinct routes, cheapest first, shaped like an OSRM route response"""
+        risk_weight = self.risk_weight if risk_weight is None else float(risk_weight)
+        alternatives = max(int(alternatives or self.alternatives), 1)
+        if not math.isfinite(risk_weight) or risk_weight < 0:
+            raise ValueError("risk_weight must be a finite number of at least 0")
+        source = self.graph.nearest_node(start_lat, start_lng)
+        target = self.graph.nearest_node(end_lat, end_lng)
+        costs = self.edge_costs(risk_weight)
+
+        paths = []
+        penalties = {}
+        for _ in range(alternatives * 2):
+            if len(paths) >= alternatives:
+                break
+            path = self.shortest_path(source, target, costs, penalties or None)
+            if path is None:
+                break
+            if not any(self._overlap(path, other) > MAX_OVERLAP for other in paths):
+                paths.append(path)
+            for edge in path:
+                penalties[edge] = penalties.get(edge, 1.0) * ALTERNATIVE_PENALTY
+
+        if not paths:
+            return {"code": "NoRoute", "message": "No route found between these points"}
+        return {
+            "code": "Ok",
+            "routes": [self._format_route(source, path, costs) for path in paths],
+            "waypoints": [self._waypoint(source), self._waypoint(target)]
+        }
+
+    def _overlap(self, path: List[int], other: List[int]) -> float:
+        lengths = self.graph.length_m
+        shared = list(set(path) & set(other))
+        total = float(lengths[path].sum())
+        return float(lengths[shared].sum()) / total if total else 1.0
+
+    def _waypoint(self, node: int) -> Dict[str, Any]:
+        return {"location": [float(self.graph.lng[node]), float(self.graph.lat[node])],
+                "name": "", "osm_node_id": int(self.graph.node_ids[node])}
+
+    def _format_route(self, source: int, path: List[int], costs: List[float]) -> Dict[str, Any]:
+        """One route as OSRM would return it: legs of steps, one step per stretch of the same road"""
+        graph = self.graph
+        path = np.asarray(path, dtype=np.intp)
+        nodes = np.concatenate(([source], graph.targets[path])).astype(np.intp)
+        lengths = graph.length_m[path].astype(np.float64)
+        durations = lengths / graph.speed_mps[path]
+        name_ids = graph.name_ids[path]
+
+        steps = []
+        bounds = np.flatnonzero(np.diff(name_ids)) + 1
+        starts = np.concatenate(([0], bounds)) if len(path) else []
+        for start, stop in zip(starts, np.concatenate((bounds, [len(path)]))):
+            name = graph.names[int(name_ids[start])]
+            step_nodes = nodes[start:stop + 1]
+            steps.append({
+                "name": name,
+                "distance": round(float(lengths[start:stop].sum()), 1),
+                "duration": round(float(durations[start:stop].sum()), 1),
+                "geometry": {"type": "LineString", "coordinates": self._coordinates(step_nodes)},
+                "maneuver": {"instruction": self._instruction(nodes, start, name)}
+            })
+        steps.append({
+            "name": steps[-1]["name"] if steps else "",
+            "distance": 0,
+            "duration": 0,
+            "geometry": {"type": "LineString", "coordinates": self._coordinates(nodes[-1:])},
+            "maneuver": {"instruction": "You have arrived at your destination"}
+        })
+        return {
+            "distance": round(float(lengths.sum()), 1),
+            "duration": round(float(durations.sum()), 1),
+            "weight": round(float(sum(costs[edge] for edge in path.tolist())), 1),
+            "weight_name": "risk_weighted_distance",
+            "geometry": {"type": "LineString", "coordinates": self._coordinates(nodes)},
+            "legs": [{"steps": steps, "distance": round(float(lengths.sum()), 1),
+                      "annotation": {"nodes": graph.node_ids[nodes].tolist()}}]
+        }
+
+    def _coordinates(self, nodes) -> List[List[float]]:
+        return np.column_stack((self.graph.lng[nodes], self.graph.lat[nodes])).tolist()
+
+    def _instruction(self, nodes, start: int, name: str) -> str:
+        road = name or "the road"
+        if start == 0:
+            return f"Head along {road}"
+        return f"{_turn(*(self._bearing(nodes[i], nodes[i + 1]) for i in (start - 1, start)))} onto {road}"
+
+    def _bearing(self, u: int, v: int) -> float:
+        lat1, lat2 = np.radians(self.graph.lat[[u, v]])
+        dlng = np.radians(self.graph.lng[v] - self.graph.lng[u])
+        return math.degrees(math.atan2(math.sin(dlng) * math.cos(lat2),
+                                       math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlng)))
+
+
+def _turn(before: float, after: float) -> str:
+    """Maneuver name for the change of heading between two bearings"""
+    delta = (after - before + 540) % 360 - 180
+    if abs(delta) < 30:
+        return "Continue"
+    if abs(delta) > 150:
+        return "Make a U-turn"
+    side = "right" if delta > 0 else "left"
+    return f"Turn {side}" if abs(delta) >= 60 else f"Bear {side}"
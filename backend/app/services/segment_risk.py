@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from app import config
+from app.services.risk_grid import GRID_DTYPE
+from app.services.risk_scoring import PointRisk, risk_codes
+from app.services.road_graph import RoadGraph, load_road_graph
+from app.utils.geo import haversine_m, meters_to_chord, to_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+# Crimes are snapped to the nearest segment within this distance, measured to
+# points sampled along each segment at this spacing
+SNAP_DISTANCE_M = 30.0
+SAMPLE_SPACING_M = 10.0
+
+TABLE_FILES = ("node_ids", "keys", "stats")
+
+
+class SegmentRiskTable:
+    """Crime statistics per road segment, keyed by the OSM node ids at its ends.
+
+    OSRM reports those ids for every route vertex (`annotation.nodes`), so
+    scoring a route becomes two binary searches per segment, however many
+    crimes the dataset holds. Segments are undirected: (u, v) and (v, u)
+    share one row. Keys are node positions in the sorted `node_ids` array
+    packed as u * n_nodes + v with u < v, and rows reuse the risk grid's
+    (mean_risk, count, risk_level) cell layout.
+    """
+
+    def __init__(self, node_ids: np.ndarray, keys: np.ndarray, stats: np.ndarray, snap_distance_m: float = None):
+        self.node_ids = node_ids
+        self.keys = keys
+        self.stats = stats
+        self.snap_distance_m = snap_distance_m
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, graph: RoadGraph, frame: pd.DataFrame, snap_distance_m: float = SNAP_DISTANCE_M,
+              sample_spacing_m: float = SAMPLE_SPACING_M) -> "SegmentRiskTable":
+        """Snap every crime to its nearest road segment and aggregate risk factors per segment"""
+        sources = graph.edge_sources()
+        u_ids = graph.node_ids[sources]
+        v_ids = graph.node_ids[graph.targets]
+        # One row per undirected segment
+        pairs, first = np.unique(np.column_stack((np.minimum(u_ids, v_ids), np.maximum(u_ids, v_ids))),
+                                 axis=0, return_index=True)
+        lo, hi = sources[first], graph.targets[first]
+        lo_lat, lo_lng, hi_lat, hi_lng = graph.lat[lo], graph.lng[lo], graph.lat[hi], graph.lng[hi]
+
+        # Sample each segment every sample_spacing_m, endpoints included
+        samples = np.maximum(np.ceil(haversine_m(lo_lat, lo_lng, hi_lat, hi_lng) / sample_spacing_m), 1).astype(np.intp) + 1
+        owners = np.repeat(np.arange(len(pairs)), samples)
+        starts = np.cumsum(samples) - samples
+        fractions = (np.arange(owners.size) - starts[owners]) / (samples[owners] - 1)
+        sample_lat = lo_lat[owners] + (hi_lat[owners] - lo_lat[owners]) * fractions
+        sample_lng = lo_lng[owners] + (hi_lng[owners] - lo_lng[owners]) * fractions
+
+        tree = cKDTree(to_unit_vectors(sample_lat, sample_lng))
+        chord, nearest = tree.query(to_unit_vectors(frame['Latitude'].to_numpy(), frame['Longitude'].to_numpy()),
+                                    distance_upper_bound=float(meters_to_chord(snap_distance_m)))
+        snapped = np.isfinite(chord)
+        segment = owners[nearest[snapped]]
+
+        counts = np.bincount(segment, minlength=len(pairs))
+        sums = np.bincount(segment, weights=frame['risk_factor'].to_numpy(dtype=np.float64)[snapped],
+                           minlength=len(pairs))
+        mean_risk = np.full(len(pairs), np.nan)
+        np.divide(sums, counts, out=mean_risk, where=counts > 0)
+
+        node_ids = np.unique(pairs)
+        keys = cls._pack(node_ids, pairs[:, 0], pairs[:, 1])
+        order = np.argsort(keys)
+        stats = np.empty(len(pairs), dtype=GRID_DTYPE)
+        stats['mean_risk'] = mean_risk[order]
+        stats['count'] = counts[order]
+        stats['risk_level'] = risk_codes(mean_risk[order])
+        logger.info(f"Snapped {int(snapped.sum())} of {len(frame)} crimes to {len(pairs)} road segments")
+        return cls(node_ids, keys[order], stats, snap_distance_m)
+
+    @staticmethod
+    def _pack(node_ids: np.ndarray, u, v) -> np.ndarray:
+        a = np.searchsorted(node_ids, u).astype(np.int64)
+        b = np.searchsorted(node_ids, v).astype(np.int64)
+        return np.minimum(a, b) * len(node_ids) + np.maximum(a, b)
+
+    def lookup(self, u_ids, v_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """Row of each (u, v) node pair, plus a mask of the pairs the table knows"""
+        u_ids = np.asarray(u_ids, dtype=np.int64)
+        v_ids = np.asarray(v_ids, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.zeros(len(u_ids), dtype=np.intp), np.zeros(len(u_ids), dtype=bool)
+        known = np.isin(u_ids, self.node_ids) & np.isin(v_ids, self.node_ids)
+        keys = self._pack(self.node_ids, u_ids, v_ids)
+        rows = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = known & (self.keys[rows] == keys)
+        return np.where(found, rows, 0), found
+
+    def node_path_stats(self, nodes) -> Optional[np.ndarray]:
+        """Stats row per vertex of a path given as consecutive OSM node ids, or None if any segment is unknown.
+
+        Each vertex takes the segment leaving it; the last one the segment
+        arriving at it.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if len(nodes) < 2:
+            return None
+        rows, found = self.lookup(nodes[:-1], nodes[1:])
+        if not found.all():
+            return None
+        return self.stats[np.append(rows, rows[-1])]
+
+    def save(self, directory):
+        """Write the table as .npy arrays plus a JSON sidecar, each replaced atomically"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in TABLE_FILES:
+            tmp_path = directory / f"{name}.tmp.npy"
+            np.save(tmp_path, np.ascontiguousarray(getattr(self, name)))
+            os.replace(tmp_path, directory / f"{name}.npy")
+        (directory / "meta.json").write_text(json.dumps({"segments": len(self), "snap_distance_m": self.snap_distance_m}))
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True) -> "SegmentRiskTable":
+        """Load a saved table, memory-mapped read-only so workers share its pages"""
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text())
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None) for name in TABLE_FILES}
+        return cls(**arrays, snap_distance_m=meta.get("snap_distance_m"))
+
+
+def segment_risk_path(profile: str = None, cache_dir=None) -> Path:
+    cache_dir = Path(cache_dir or config.CACHE_DIR)
+    return cache_dir / f"segment_risk_{profile or config.ROAD_GRAPH_PROFILE}"
+
+
+def load_segment_risk(profile: str = None, cache_dir=None) -> Optional[SegmentRiskTable]:
+    """The prebuilt table for a profile, or None when none has been built"""
+    path = segment_risk_path(profile, cache_dir)
+    if not (path / "meta.json").exists():
+        return None
+    return SegmentRiskTable.load(path)
+
+
+def route_point_risk(table: SegmentRiskTable, route: Dict[str, Any], coords: np.ndarray,
+                     incidents=None, radius_m: float = None) -> Optional[PointRisk]:
+    """Risk of an OSRM route's step coordinates from its annotation nodes, or None to fall back.
+
+    OSRM's overview geometry has one vertex per annotated node (legs share
+    their junction vertex), so each vertex's segment risk is matched to the
+    overlapping step coordinates by position. Incidents logged since the
+    table was built are folded in around the vertices they are near. Routes
+    without annotations, or crossing segments missing from the table,
+    return None.
+    """
+    legs = route.get('legs', [])
+    geometry = route.get('geometry', {}).get('coordinates')
+    nodes = []
+    for leg in legs:
+        leg_nodes = leg.get('annotation', {}).get('nodes', [])
+        nodes.extend(leg_nodes[1:] if nodes else leg_nodes)
+    if not geometry or len(nodes) != len(geometry):
+        return None
+    stats = table.node_path_stats(nodes)
+    if stats is None:
+        return None
+
+    by_vertex = {(lng, lat): i for i, (lng, lat) in enumerate(tuple(c[:2]) for c in geometry)}
+    index = np.fromiter((by_vertex.get((lng, lat), -1) for lng, lat in coords.tolist()), dtype=np.intp,
+                        count=len(coords))
+    if (index < 0).any():
+        return None
+    stats = stats[index]
+    avg_risk = stats['mean_risk'].astype(np.float64)
+    levels = stats['risk_level'].copy()
+    if incidents is not None and len(incidents) and len(coords):
+        sums, counts = incidents.radius_sums(coords[:, 1], coords[:, 0], radius_m or config.RISK_RADIUS_M)
+        near = counts > 0
+        base = stats['count'][near].astype(np.float64)
+        avg_risk[near] = (np.nan_to_num(avg_risk[near]) * base + sums[near]) / (base + counts[near])
+        levels[near] = risk_codes(avg_risk[near])
+    return PointRisk(levels, avg_risk)
+
+
+if __name__ == "__main__":
+    from app.services.dataset import CrimeDataset
+
+    parser = argparse.ArgumentParser(description="Aggregate crime risk per road segment of the road graph")
+    parser.add_argument("--profile", default=config.ROAD_GRAPH_PROFILE)
+    parser.add_argument("--snap-distance-m", type=float, default=SNAP_DISTANCE_M)
+    parser.add_argument("--cache-dir", default=str(config.CACHE_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    road_graph = load_road_graph(args.profile, args.cache_dir)
+    if road_graph is None:
+        parser.error("no road graph built for this profile; run python -m app.services.road_graph first")
+    built = SegmentRiskTable.build(road_graph, CrimeDataset(cache_dir=args.cache_dir).frame, args.snap_distance_m)
+    built.save(segment_risk_path(args.profile, args.cache_dir))
+    print(f"Segment risk table with {len(built)} segments ready")
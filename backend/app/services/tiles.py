@@ -0,0 +1,298 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app import config
+from app.services.crime_data import source_signature
+from app.services.heatmap import TILE_SIZE, mercator_pixels
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_NAME = "tile_cache"
+
+# Served tile formats and their content types
+TILE_FORMATS = {"png": "image/png", "bin": "application/octet-stream"}
+# Cells per side of a tile's density grid, each TILE_SIZE / TILE_GRID = 4 screen pixels wide
+TILE_GRID = 64
+# Smoothing kernel applied to the grid before drawing, and the cells it reaches past the tile edge
+BLUR_KERNEL = np.array([1.0, 4.0, 6.0, 4.0, 1.0]) / 16.0
+BLUR_PAD = len(BLUR_KERNEL) // 2
+# Heat color ramp: intensity stop -> RGBA
+COLOR_STOPS = np.array([0.0, 0.3, 0.6, 1.0])
+COLOR_RAMP = np.array([
+    [255, 255, 0, 0],
+    [255, 230, 0, 140],
+    [255, 120, 0, 190],
+    [210, 0, 0, 230]
+], dtype=np.float64)
+NO_RISK = 255  # Mean-risk byte of binary tile cells without crimes
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a Web Mercator tile in degrees"""
+    n = 2 ** z
+    west, east = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    north = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+    south = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n))))
+    return float(south), west, float(north), east
+
+
+def _padded_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Tile bounds grown by the BLUR_PAD cells the smoothing kernel reaches past each edge"""
+    south, west, north, east = tile_bounds(z, x, y)
+    margin_lat = (north - south) * BLUR_PAD / TILE_GRID
+    margin_lng = (east - west) * BLUR_PAD / TILE_GRID
+    return south - margin_lat, west - margin_lng, north + margin_lat, east + margin_lng
+
+
+def tile_grid(lat, lng, risk, z: int, x: int, y: int, pad: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Crime count and summed risk_factor per TILE_GRID cell of a tile, plus `pad` cells around it"""
+    size = TILE_GRID + 2 * pad
+    px, py = mercator_pixels(lat, lng, z)
+    cell_px = TILE_SIZE / TILE_GRID
+    cols = np.floor((px - x * TILE_SIZE) / cell_px).astype(np.intp) + pad
+    rows = np.floor((py - y * TILE_SIZE) / cell_px).astype(np.intp) + pad
+    inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+    flat = rows[inside] * size + cols[inside]
+    counts = np.bincount(flat, minlength=size * size).reshape(size, size)
+    sums = np.bincount(flat, weights=np.asarray(risk, dtype=np.float64)[inside], minlength=size * size)
+    return counts, sums.reshape(size, size)
+
+
+def encode_bin(counts: np.ndarray, sums: np.ndarray) -> bytes:
+    """Binary tile: TILE_GRID x TILE_GRID little-endian uint16 crime counts, then uint8 mean risk_factor.
+
+    Both grids are row-major from the tile's north-west corner. Mean risk is
+    stored in tenths (0-100), NO_RISK where a cell has no crimes.
+    """
+    mean = np.divide(sums, counts, out=np.zeros(sums.shape), where=counts > 0)
+    risk = np.where(counts > 0, np.clip(np.round(mean * 10), 0, 100), NO_RISK).astype(np.uint8)
+    return np.minimum(counts, np.iinfo(np.uint16).max).astype('<u2').tobytes() + risk.tobytes()
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encode an (H, W, 4) uint8 array as an RGBA PNG with the standard library"""
+    height, width = rgba.shape[:2]
+    # Each scanline starts with filter type 0 (none)
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def render_png(sums: np.ndarray, z: int) -> bytes:
+    """Draw a padded risk-sum grid as a smoothed heat tile.
+
+    Intensity is log-scaled against TILE_FULL_INTENSITY at zoom 14, four
+    times more per zoom level out since each cell covers four times the
+    area, so neighbouring tiles and zoom levels share one scale.
+    """
+    blurred = np.apply_along_axis(np.convolve, 0, sums, BLUR_KERNEL, mode='same')
+    blurred = np.apply_along_axis(np.convolve, 1, blurred, BLUR_KERNEL, mode='same')
+    blurred = blurred[BLUR_PAD:BLUR_PAD + TILE_GRID, BLUR_PAD:BLUR_PAD + TILE_GRID]
+    full = config.TILE_FULL_INTENSITY * 4.0 ** (14 - z)
+    intensity = np.clip(np.log1p(blurred) / np.log1p(full), 0.0, 1.0)
+
+    rgba = np.stack([np.interp(intensity, COLOR_STOPS, COLOR_RAMP[:, channel]) for channel in range(4)], axis=-1)
+    rgba[intensity <= 0] = 0
+    scale = TILE_SIZE // TILE_GRID
+    return encode_png(np.repeat(np.repeat(rgba.astype(np.uint8), scale, axis=0), scale, axis=1))
+
+
+@lru_cache(maxsize=None)
+def empty_tile(fmt: str) -> bytes:
+    """The one tile served wherever there are no crimes, rendered once per format"""
+    if fmt == "bin":
+        zeros = np.zeros((TILE_GRID, TILE_GRID))
+        return encode_bin(zeros.astype(np.int64), zeros)
+    return encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+class TileCache:
+    """Heatmap tiles of one year's crimes, rendered on first request.
+
+    Rendered tiles are written under `cache_dir/tiles/<version>/` until the
+    directory holds TILE_DISK_CACHE_MB, and the most recent ones also kept
+    in an LRU bounded by TILE_MEMORY_CACHE_MB. Tiles without crimes are
+    never rendered or written; they all share `empty_tile`. The version
+    hashes the crime CSV's signature and the render settings, so tiles from
+    older data are never served and are removed on first use.
+    """
+
+    def __init__(self, dataset, cache_dir=None, memory_bytes: int = None, disk_bytes: int = None):
+        self.dataset = dataset
+        self.directory = Path(cache_dir or dataset.cache_dir or config.CACHE_DIR) / "tiles"
+        memory_bytes = config.TILE_MEMORY_CACHE_MB * 2 ** 20 if memory_bytes is None else memory_bytes
+        self._memory = TTLCache(maxsize=int(memory_bytes), weigh=len)
+        self.disk_limit = int(config.TILE_DISK_CACHE_MB * 2 ** 20 if disk_bytes is None else disk_bytes)
+        self._disk_used = None
+        self._disk_lock = threading.Lock()
+        self._bounds = {}
+        self._version = None
+
+    def init_app(self, app):
+        app.extensions[EXTENSION_NAME] = self
+        return self
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            settings = [source_signature(self.dataset.csv_path), TILE_GRID, config.TILE_FULL_INTENSITY]
+            self._version = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+            self._remove_stale()
+        return self._version
+
+    def _remove_stale(self):
+        if not self.directory.exists():
+            return
+        for path in self.directory.iterdir():
+            if path.is_dir() and path.name != self._version:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def tile_path(self, year: int, z: int, x: int, y: int, fmt: str) -> Path:
+        return self.directory / self.version / str(year) / str(z) / str(x) / f"{y}.{fmt}"
+
+    def data_bounds(self, year: int) -> Optional[Tuple[float, float, float, float]]:
+        """(south, west, north, east) of a year's crimes; None when the year has no data"""
+        if year not in self._bounds:
+            partition = self.dataset.partition(year)
+            if partition is None:
+                return None
+            lat = partition.frame['Latitude'].to_numpy()
+            lng = partition.frame['Longitude'].to_numpy()
+            self._bounds[year] = (float(np.nanmin(lat)), float(np.nanmin(lng)),
+                                  float(np.nanmax(lat)), float(np.nanmax(lng)))
+        return self._bounds[year]
+
+    def covers(self, year: int, z: int, x: int, y: int) -> bool:
+        """Whether a tile, or the blur reaching in from its edges, overlaps the year's crimes"""
+        bounds = self.data_bounds(year)
+        if bounds is None:
+            return False
+        south, west, north, east = _padded_bounds(z, x, y)
+        return not (north < bounds[0] or east < bounds[1] or south > bounds[2] or west > bounds[3])
+
+    def get(self, year: int, z: int, x: int, y: int, fmt: str = "png") -> Optional[bytes]:
+        """Tile bytes from memory, disk or a fresh render; None when the year has no data"""
+        if not self.covers(year, z, x, y):
+            return None if self.data_bounds(year) is None else empty_tile(fmt)
+        key = (year, z, x, y, fmt)
+        data = self._memory.get(key)
+        if data is not None:
+            return data
+        path = self.tile_path(year, z, x, y, fmt)
+        if path.exists():
+            data = path.read_bytes()
+        else:
+            data = self.render(year, z, x, y, fmt)
+            if data is None or data is empty_tile(fmt):
+                return data
+            self._write(path, data)
+        self._memory.set(key, data)
+        return data
+
+    def _write(self, path: Path, data: bytes):
+        """Save a rendered tile unless the disk cache is full; later tiles are then only kept in memory"""
+        with self._disk_lock:
+            if self._disk_used is None:
+                root = self.directory / self.version
+                self._disk_used = sum(p.stat().st_size for p in root.rglob("*") if p.is_file()) \
+                    if root.exists() else 0
+            if self._disk_used + len(data) > self.disk_limit:
+                if self._disk_used <= self.disk_limit:
+                    logger.warning(f"Tile disk cache reached {self.disk_limit} bytes, new tiles stay in memory")
+                    self._disk_used = self.disk_limit + 1
+                return
+            self._disk_used += len(data)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def render(self, year: int, z: int, x: int, y: int, fmt: str = "png") -> Optional[bytes]:
+        """Draw a tile; None when the year has no data, `empty_tile(fmt)` when no crime is near it"""
+        partition = self.dataset.partition(year)
+        if partition is None:
+            return None
+        frame = partition.frame
+        lat = frame['Latitude'].to_numpy()
+        lng = frame['Longitude'].to_numpy()
+        # Cheap bounding-box cut, with room for the blur to reach in from neighbouring tiles
+        south, west, north, east = _padded_bounds(z, x, y)
+        near = (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        if not near.any():
+            return empty_tile(fmt)
+        risk = frame['risk_factor'].to_numpy()[near]
+        if fmt == "bin":
+            return encode_bin(*tile_grid(lat[near], lng[near], risk, z, x, y))
+        _, sums = tile_grid(lat[near], lng[near], risk, z, x, y, pad=BLUR_PAD)
+        return render_png(sums, z)
+
+    def prewarm(self, years: Iterable[int], zooms: Iterable[int], formats: Iterable[str] = ("png",)) -> int:
+        """Render every tile holding crimes of the given years at the given zooms; returns how many"""
+        rendered = 0
+        for year in years:
+            partition = self.dataset.partition(year)
+            if partition is None:
+                logger.warning(f"No crimes recorded in {year}, skipping")
+                continue
+            lat = partition.frame['Latitude'].to_numpy()
+            lng = partition.frame['Longitude'].to_numpy()
+            for z in zooms:
+                px, py = mercator_pixels(lat, lng, z)
+                tiles = np.unique(np.column_stack((px // TILE_SIZE, py // TILE_SIZE)).astype(np.int64), axis=0)
+                for x, y in tiles.tolist():
+                    for fmt in formats:
+                        self.get(year, z, x, y, fmt)
+                        rendered += 1
+                logger.info(f"{year} zoom {z}: {len(tiles)} tiles")
+        return rendered
+
+
+def get_tile_cache() -> TileCache:
+    """Tile cache registered on the current Flask app"""
+    return current_app.extensions[EXTENSION_NAME]
+
+
+def parse_zooms(value: str):
+    """Zoom levels from "12", "10-14" or "10,12,14" """
+    zooms = []
+    for part in value.split(","):
+        lo, _, hi = part.partition("-")
+        zooms.extend(range(int(lo), int(hi or lo) + 1))
+    return zooms
+
+
+if __name__ == "__main__":
+    from app.services.dataset import CrimeDataset
+
+    parser = argparse.ArgumentParser(description="Render heatmap tiles into the tile cache ahead of time")
+    parser.add_argument("--zooms", default="10-14", help='zoom levels, e.g. "12", "10-14" or "10,12,14"')
+    parser.add_argument("--years", type=int, nargs="*", help="years to render (default: all)")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=sorted(TILE_FORMATS))
+    parser.add_argument("--cache-dir", default=str(config.CACHE_DIR))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    dataset = CrimeDataset(cache_dir=args.cache_dir)
+    cache = TileCache(dataset, memory_bytes=0)
+    count = cache.prewarm(args.years or dataset.years, parse_zooms(args.zooms), args.formats)
+    print(f"{count} tiles ready in {cache.directory / cache.version}")
@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.crime_store import CrimePointStore
+
+
+class YearPartition:
+    """One year of crimes as a contiguous, date-sorted slice of the dataset.
+
+    Because rows are sorted by date, every month and every date range is a
+    contiguous run of positions found by binary search, and the partition
+    carries its own spatial index so radius queries never touch other years.
+    """
+
+    def __init__(self, year: int, frame: pd.DataFrame):
+        self.year = year
+        self.frame = frame
+        self._dates = frame['Date'].to_numpy()
+        month_starts = np.array([f"{year:04d}-{month:02d}-01" for month in range(1, 13)] + [f"{year + 1:04d}-01-01"],
+                                dtype='datetime64[D]').astype(self._dates.dtype)
+        self._month_bounds = np.searchsorted(self._dates, month_starts)
+        self._lock = threading.Lock()
+        self._store = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def store(self) -> CrimePointStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = CrimePointStore(self.frame)
+        return self._store
+
+    def month_range(self, month: int):
+        """Position range [start, stop) holding the given calendar month"""
+        if not 1 <= month <= 12:
+            raise ValueError("month must be between 1 and 12")
+        return int(self._month_bounds[month - 1]), int(self._month_bounds[month])
+
+    def date_range(self, start=None, end=None):
+        """Position range [start, stop) for dates in [start, end); either bound may be omitted"""
+        lo = 0 if start is None else int(np.searchsorted(self._dates, self._as_date(start), side='left'))
+        hi = len(self) if end is None else int(np.searchsorted(self._dates, self._as_date(end), side='left'))
+        return lo, max(lo, hi)
+
+    def _as_date(self, value):
+        return pd.Timestamp(value).to_datetime64().astype(self._dates.dtype)
+
+    def query(self, lat: float, lng: float, radius_m: float, months: Optional[Iterable[int]] = None,
+              start=None, end=None, primary_types: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Crimes within radius_m of (lat, lng), optionally narrowed by month, date range and type"""
+        positions = self.store.query_radius(lat, lng, radius_m)
+
+        if start is not None or end is not None:
+            lo, hi = self.date_range(start, end)
+            positions = positions[(positions >= lo) & (positions < hi)]
+
+        if months:
+            keep = np.zeros(len(positions), dtype=bool)
+            for month in set(months):
+                lo, hi = self.month_range(month)
+                keep |= (positions >= lo) & (positions < hi)
+            positions = positions[keep]
+
+        if primary_types:
+            types = self.frame['Primary Type']
+            wanted = [types.cat.categories.get_loc(t) for t in primary_types if t in types.cat.categories]
+            positions = positions[np.isin(types.cat.codes.to_numpy()[positions], wanted)]
+
+        return self.frame.iloc[positions]
+
+
+def build_year_partitions(frame: pd.DataFrame) -> Dict[int, YearPartition]:
+    """Split a date-sorted frame into per-year partitions without copying rows"""
+    years = frame['year'].to_numpy()
+    distinct = np.unique(years)
+    bounds = np.searchsorted(years, np.append(distinct, distinct[-1] + 1) if len(distinct) else distinct)
+    return {
+        int(year): YearPartition(int(year), frame.iloc[bounds[i]:bounds[i + 1]])
+        for i, year in enumerate(distinct)
+    }
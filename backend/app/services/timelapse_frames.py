@@ -0,0 +1,53 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.heatmap import aggregate_heatmap, resolve_mode
+from app.services.time_index import YearPartition
+from app.utils.serialization import pack_array, packed_point_columns, point_columns
+
+GRANULARITIES = ("year", "month")
+FRAME_FIELDS = ("lat", "lng", "intensity", "severity", "risk_level")
+# Frame payloads: JSON lists, or packed arrays sent as Socket.IO binary attachments
+FRAME_FORMATS = ("columns", "binary")
+# Packed dtype of each aggregated cell column
+CELL_DTYPES = {"lat": "float32", "lng": "float32", "weight": "float32", "count": "uint32"}
+
+
+def frame_keys(years: Iterable[int], start_year: int, end_year: int,
+               granularity: str = "year") -> List[Tuple[int, Optional[int]]]:
+    """(year, month) keys of every frame in the range; month is None for yearly frames"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    selected = [year for year in years if start_year <= year <= end_year]
+    if granularity == "year":
+        return [(year, None) for year in selected]
+    return [(year, month) for year in selected for month in range(1, 13)]
+
+
+def build_frame(partition: YearPartition, lat: float, lng: float, radius_m: float, month: Optional[int] = None,
+                primary_types: Optional[List[str]] = None, zoom: Optional[int] = None,
+                weight: str = "risk", frame_format: str = "columns") -> Dict[str, Any]:
+    """One compact, columnar timelapse frame for a year or a month of it.
+
+    With a zoom level below the raw-points threshold the frame carries
+    aggregated heatmap `cells` instead of individual `points`. The binary
+    format packs each column into little-endian bytes (see PACKED_DTYPES and
+    CELL_DTYPES) and dictionary-encodes strings.
+    """
+    df = partition.query(lat, lng, radius_m, months=[month] if month else None, primary_types=primary_types)
+    binary = frame_format == "binary"
+    if resolve_mode(None, zoom) == "aggregate":
+        cells = aggregate_heatmap(df, zoom, weight)
+        return {
+            "year": partition.year,
+            "month": month,
+            "count": len(df),
+            "zoom": zoom,
+            "cells": {field: pack_array(cells[field], dtype) for field, dtype in CELL_DTYPES.items()}
+            if binary else cells
+        }
+    return {
+        "year": partition.year,
+        "month": month,
+        "count": len(df),
+        "points": packed_point_columns(df, FRAME_FIELDS) if binary else point_columns(df, FRAME_FIELDS)
+    }
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored.
+
+    With `sliding`, every hit restarts the entry's ttl, so entries expire
+    once they have been idle for `ttl` seconds instead. With `weigh`,
+    `maxsize` bounds the total weight of the values (e.g. their length in
+    bytes) rather than their number.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, sliding: bool = False,
+                 weigh: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sliding = sliding
+        self.weigh = weigh or (lambda value: 1)
+        self.weight = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return default
+            if self.sliding and expires_at is not None:
+                self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        weight = self.weigh(value)
+        if self.maxsize <= 0 or weight > self.maxsize:
+            return
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (value, expires_at)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= self.weigh(entry[0])
+        return entry
@@ -0,0 +1,37 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0  # Mean Earth radius in meters
+METERS_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180  # Along a meridian
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great circle distance in meters; accepts scalars or NumPy arrays in degrees"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_vectors(lat, lng):
+    """Project degree coordinates onto the unit sphere as an (N, 3) array"""
+    return unit_vectors_from_radians(np.radians(np.asarray(lat, dtype=np.float64)),
+                                     np.radians(np.asarray(lng, dtype=np.float64)))
+
+
+def unit_vectors_from_radians(lat, lng):
+    """to_unit_vectors for coordinates already in radians"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+def meters_to_chord(meters):
+    """Convert a surface distance to the straight-line chord on the unit sphere"""
+    return 2.0 * np.sin(np.asarray(meters, dtype=np.float64) / (2.0 * EARTH_RADIUS_M))
+
+
+def chord_to_meters(chord):
+    """Inverse of meters_to_chord"""
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
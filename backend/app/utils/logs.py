@@ -0,0 +1,54 @@
+import json
+import logging
+import random
+from typing import Any
+
+from app import config
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats a record's message followed by its `fields` as key=value pairs, or the whole record as JSON"""
+
+    def __init__(self, json_lines: bool = False):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.json_lines:
+            entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                     "event": record.getMessage(), **fields}
+            if record.exc_info:
+                entry["exc_info"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """Set the root level and, unless a server (e.g. gunicorn) already installed handlers, a structured one"""
+    root = logging.getLogger()
+    root.setLevel(level or config.LOG_LEVEL)
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter((fmt or config.LOG_FORMAT) == "json"))
+        root.addHandler(handler)
+
+
+def log_event(logger: logging.Logger, level: int, event: str, sample_rate: float = None, exc_info=False,
+              **fields: Any):
+    """Log `event` with structured `fields` when `logger` is enabled for `level`.
+
+    The level is checked before anything else, so a disabled call costs one
+    method call; callers pass raw values and never format strings up front.
+    DEBUG and INFO events are kept at `sample_rate` (LOG_SAMPLE_RATE by
+    default), warnings and errors always.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if level < logging.WARNING and rate < 1.0 and random.random() >= rate:
+        return
+    logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
@@ -0,0 +1,216 @@
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Token counts of model prompts and replies
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+class Registry:
+    """Metrics of one process, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List["Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "Metric") -> "Metric":
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    """A named metric with optional labels; `labels(...)` returns the child holding one label set's values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(v) for v in values) or tuple(str(kwargs[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Value holder of one label set"""
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines of every label set"""
+
+    # Unlabelled metrics act as their own single child
+    def __getattr__(self, attr):
+        if attr.startswith("_") or self.labelnames:
+            raise AttributeError(attr)
+        return getattr(self._children[()], attr)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    @contextmanager
+    def track_inprogress(self):
+        """Count the enclosed block as in progress while it runs"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+                for key, child in list(self._children.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _Buckets:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the enclosed block's duration in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _Buckets(self.buckets)
+
+    def samples(self):
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = [("le", _format_value(bound))]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# Hot paths instrumented across the app, one definition each so every module shares them
+
+TIMELAPSE_PHASE_SECONDS = Histogram(
+    "citisafe_timelapse_phase_seconds", "Time spent in each phase of a /timelapse/ request", ["phase"])
+OSRM_REQUEST_SECONDS = Histogram(
+    "citisafe_osrm_request_seconds", "Latency of OSRM route calls that missed the response cache", ["outcome"])
+OSRM_CACHE_HITS = Counter(
+    "citisafe_osrm_cache_hits_total", "OSRM route calls answered from the response cache")
+ROUTE_SCORING_SECONDS = Histogram(
+    "citisafe_route_scoring_seconds", "Time to score and format the routes of one route request", ["format"])
+ROUTES_SCORED = Counter(
+    "citisafe_routes_scored_total", "Routes scored, by whether the segment table or the spatial scorer scored them",
+    ["source"])
+CHAT_MODEL_SECONDS = Histogram(
+    "citisafe_chat_model_seconds", "Latency of chat model replies, to the last chunk when streaming", ["mode"])
+CHAT_MODEL_TOKENS = Histogram(
+    "citisafe_chat_model_tokens", "Tokens per chat model call, as reported by the model", ["kind"],
+    buckets=TOKEN_BUCKETS)
+CHAT_CACHE_HITS = Counter(
+    "citisafe_chat_cache_hits_total", "Chat replies served from the response cache")
+CHAT_CACHE_MISSES = Counter(
+    "citisafe_chat_cache_misses_total", "Chat response cache lookups that found no reply")
+INCIDENT_APPEND_SECONDS = Histogram(
+    "citisafe_incident_append_seconds", "Time from an incident append to its batch being committed")
+INCIDENT_COMMIT_SECONDS = Histogram(
+    "citisafe_incident_commit_seconds", "Time to commit one batch of incidents")
+CONNECTED_CLIENTS = Gauge(
+    "citisafe_connected_clients", "Socket.IO clients connected to this process", ["namespace"])
+IN_FLIGHT = Gauge(
+    "citisafe_in_flight_requests", "Requests being handled by this process", ["kind"])
+HTTP_REQUESTS = Counter(
+    "citisafe_http_requests_total", "HTTP requests handled, by endpoint and status code", ["endpoint", "status"])
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,121 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+# Response field -> (source column, kind) for serialized crime points
+POINT_FIELDS = {
+    "lat": ("Latitude", "coord"),
+    "lng": ("Longitude", "coord"),
+    "intensity": ("risk_factor", "float"),
+    "severity": ("severity_score", "float"),
+    "type": ("Primary Type", "str"),
+    "description": ("Description", "str"),
+    "risk_level": ("risk_level", "str"),
+    "date": ("Date", "date")
+}
+LAYOUTS = ("rows", "columns")
+# Packed (binary) point columns: field kind -> little-endian dtype; strings are dictionary-encoded
+PACKED_DTYPES = {"coord": "float32", "float": "float32", "date": "uint32", "str": "dictionary"}
+
+
+def format_dates(series: pd.Series) -> List[str]:
+    """Format a datetime column as 'YYYY-MM-DD HH:MM:SS' strings in one vectorized pass"""
+    values = np.datetime_as_string(series.to_numpy(dtype='datetime64[s]'), unit='s')
+    if not len(values):
+        # np.char.replace cannot size its output from an empty array
+        return []
+    return np.char.replace(values, 'T', ' ').tolist()
+
+
+def string_values(series: pd.Series) -> List[Optional[str]]:
+    """Python strings for a column, mapping categorical codes through their categories once"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = np.append(np.asarray(series.cat.categories, dtype=object), None)
+        # Code -1 (missing) indexes the trailing None
+        return categories[series.cat.codes.to_numpy()].tolist()
+    return series.astype(str).tolist()
+
+
+def point_columns(df: pd.DataFrame, fields: Sequence[str] = tuple(POINT_FIELDS)) -> Dict[str, list]:
+    """Serialize crime points column by column into plain Python lists"""
+    columns = {}
+    for field in fields:
+        column, kind = POINT_FIELDS[field]
+        series = df[column]
+        if kind == "coord":
+            # Coordinates are stored as float32; trim the widening noise to ~0.1m
+            columns[field] = np.round(series.to_numpy(dtype=np.float64), 6).tolist()
+        elif kind == "float":
+            columns[field] = series.to_numpy(dtype=np.float64).tolist()
+        elif kind == "date":
+            columns[field] = format_dates(series)
+        else:
+            columns[field] = string_values(series)
+    return columns
+
+
+def pack_array(values, dtype: str) -> bytes:
+    """Little-endian bytes of `values` as `dtype`, sent by Socket.IO as a binary attachment"""
+    return np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+
+
+def dictionary_encode(series: pd.Series) -> Dict[str, Any]:
+    """Strings as {"values": distinct strings, "codes": packed indexes into them, "dtype": the codes' dtype}.
+
+    Missing values get their own None entry in `values`.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    values = [None if pd.isna(value) else str(value) for value in uniques]
+    dtype = "uint8" if len(values) <= 2 ** 8 else "uint16" if len(values) <= 2 ** 16 else "uint32"
+    return {"values": values, "codes": pack_array(codes, dtype), "dtype": dtype}
+
+
+def packed_point_columns(df: pd.DataFrame, fields: Sequence[str] = tuple(POINT_FIELDS)) -> Dict[str, Any]:
+    """point_columns as packed arrays: float32 coordinates and values, uint32 dates, dictionary-encoded strings.
+
+    Dates are seconds since 1970-01-01 of the crime's local time, like the
+    'YYYY-MM-DD HH:MM:SS' strings of the JSON encoding.
+    """
+    columns = {}
+    for field in fields:
+        column, kind = POINT_FIELDS[field]
+        series = df[column]
+        if kind == "date":
+            columns[field] = pack_array(series.to_numpy(dtype='datetime64[s]').astype(np.int64), "uint32")
+        elif kind == "str":
+            columns[field] = dictionary_encode(series)
+        else:
+            columns[field] = pack_array(series.to_numpy(), PACKED_DTYPES[kind])
+    return columns
+
+
+def columns_to_records(columns: Dict[str, list]) -> List[Dict[str, Any]]:
+    """Turn {"field": [...]} columns into the row-wise [{"field": value}] shape"""
+    keys = list(columns)
+    return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+
+def layout_points(columns: Dict[str, list], layout: str = "rows"):
+    """Return columns as-is for the columnar layout, or as records for the row-wise one"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}")
+    return columns if layout == "columns" else columns_to_records(columns)
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode JSON with orjson when installed (NumPy arrays included), else the json module"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype='application/json')
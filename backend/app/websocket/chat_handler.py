@@ -1,38 +1,63 @@
 from flask_socketio import SocketIO, emit
 from flask import request
+from app import config
 from app.model.gemini_agent import GeminiAgent, ToolCategory
+from app.model.local_model import EchoModel
+from app.utils.logs import log_event
+from app.utils.metrics import CONNECTED_CLIENTS, IN_FLIGHT
+from app.websocket.message_queue import message_queue_options
+from app.websocket.tasks import task_runner
 import os
+import threading
+import uuid
 from dotenv import load_dotenv
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize SocketIO with threading mode
-socketio = SocketIO(cors_allowed_origins="*", async_mode='threading', logger=True, engineio_logger=True)
+# Initialize SocketIO in the configured async mode; slow work is handed to the shared task runner
+socketio = SocketIO(cors_allowed_origins="*", async_mode=config.SOCKETIO_ASYNC_MODE,
+                    logger=config.SOCKETIO_LOGGING, engineio_logger=config.SOCKETIO_LOGGING)
+task_runner.init_socketio(socketio)
 gemini_agent = None
+# Streaming replies in progress, one per client: sid -> (stream_id, cancel event)
+_chat_streams = {}
+_chat_streams_lock = threading.Lock()
 
-def init_socketio(app):
+def init_socketio(app, agent=None):
     global gemini_agent
     try:
         logger.info("Initializing SocketIO...")
-        socketio.init_app(app)
-        api_key = os.getenv("AI_API_KEY")
-        if not api_key:
-            raise ValueError("AI_API_KEY environment variable is not set")
-        gemini_agent = GeminiAgent(api_key=api_key)
+        # With a message queue, emits and rooms span every worker process
+        socketio.init_app(app,
+                          cors_allowed_origins="*",
+                          async_mode=config.SOCKETIO_ASYNC_MODE,
+                          logger=config.SOCKETIO_LOGGING,
+                          engineio_logger=config.SOCKETIO_LOGGING,
+                          **message_queue_options())
+        if agent is None:
+            agent = _create_agent()
+        gemini_agent = agent
         logger.info("SocketIO initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing SocketIO: {str(e)}")
         raise
 
+def _create_agent():
+    if config.CHAT_MODEL == "echo":
+        return GeminiAgent(model=EchoModel())
+    api_key = os.getenv("AI_API_KEY")
+    if not api_key:
+        raise ValueError("AI_API_KEY environment variable is not set")
+    return GeminiAgent(api_key=api_key, model_name=config.CHAT_MODEL)
+
 @socketio.on('connect')
 def handle_connect():
-    logger.info(f"Client connected: {request.sid}")
+    CONNECTED_CLIENTS.labels('/').inc()
+    log_event(logger, logging.DEBUG, "chat client connected", sid=request.sid)
     try:
         # Send available tools to the client upon connection
         tools_info = gemini_agent.get_available_tools()
@@ -40,18 +65,29 @@ def handle_connect():
             'data': 'Connected',
             'available_tools': tools_info
         })
-        logger.info(f"Sent tools info to client {request.sid}")
     except Exception as e:
         logger.error(f"Error in handle_connect: {str(e)}")
         emit('error', {'message': str(e)})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    logger.info(f"Client disconnected: {request.sid}")
+    CONNECTED_CLIENTS.labels('/').dec()
+    log_event(logger, logging.DEBUG, "chat client disconnected", sid=request.sid)
+    _stop_chat_stream(request.sid)
+    if gemini_agent is not None:
+        gemini_agent.end_session(request.sid)
 
 @socketio.on('chat_message')
 def handle_message(data):
-    logger.info(f"Received message from {request.sid}: {data}")
+    log_event(logger, logging.DEBUG, "chat message", sid=request.sid, data=data)
+    # Tool and Gemini calls are slow I/O; answer from a background task so other clients are not held up
+    task_runner.spawn(_process_message, request.sid, data)
+
+def _process_message(sid, data):
+    with IN_FLIGHT.labels("chat").track_inprogress():
+        _answer_message(sid, data)
+
+def _answer_message(sid, data):
     try:
         message = data.get('message', '')
         tool_name = data.get('tool')
@@ -62,43 +98,93 @@ def handle_message(data):
             if tool_name in gemini_agent.tools:
                 tool = gemini_agent.tools[tool_name]
                 result = tool.function(**tool_data)
-                emit('tool_response', {
+                task_runner.emit_to(sid, 'tool_response', {
                     'tool': tool_name,
                     'result': result,
                     'category': tool.category.value
                 })
-                logger.info(f"Tool {tool_name} executed successfully")
+                log_event(logger, logging.DEBUG, "tool executed", sid=sid, tool=tool_name)
             else:
                 error_msg = f'Tool {tool_name} not found'
                 logger.warning(error_msg)
-                emit('error', {
+                task_runner.emit_to(sid, 'error', {
                     'message': error_msg,
                     'available_tools': gemini_agent.get_available_tools()
                 })
+        elif data.get('stream'):
+            _stream_reply(sid, message)
         else:
             # Handle regular chat
-            response = gemini_agent.chat(message)
-            emit('chat_response', response)
-            logger.info(f"Chat response sent to {request.sid}")
+            response = gemini_agent.chat(message, session_id=sid)
+            task_runner.emit_to(sid, 'chat_response', response)
             
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error in handle_message: {error_msg}")
-        emit('error', {
+        task_runner.emit_to(sid, 'error', {
             'message': error_msg,
             'type': 'error'
         })
 
+def _stream_reply(sid, message):
+    """Emit the reply as chat_response_chunk events, then chat_response_complete"""
+    stream_id = uuid.uuid4().hex
+    cancelled = threading.Event()
+    _stop_chat_stream(sid)
+    with _chat_streams_lock:
+        _chat_streams[sid] = (stream_id, cancelled)
+
+    chunks = []
+    status = 'success'
+    try:
+        task_runner.emit_to(sid, 'chat_response_start', {'stream_id': stream_id})
+        for text in gemini_agent.chat_stream(message, cancelled, session_id=sid):
+            task_runner.emit_to(sid, 'chat_response_chunk', {
+                'stream_id': stream_id,
+                'index': len(chunks),
+                'text': text
+            })
+            chunks.append(text)
+    except Exception as e:
+        logger.error(f"Error streaming reply to {sid}: {str(e)}")
+        chunks.append(f"Error: {str(e)}")
+        status = 'error'
+    finally:
+        with _chat_streams_lock:
+            if _chat_streams.get(sid, (None,))[0] == stream_id:
+                del _chat_streams[sid]
+
+    if cancelled.is_set():
+        status = 'cancelled'
+    task_runner.emit_to(sid, 'chat_response_complete', {
+        'stream_id': stream_id,
+        'reply': ''.join(chunks),
+        'status': status
+    })
+    log_event(logger, logging.DEBUG, "chat reply streamed", sid=sid, status=status, chunks=len(chunks))
+
+def _stop_chat_stream(sid):
+    with _chat_streams_lock:
+        stream = _chat_streams.pop(sid, None)
+    if stream is not None:
+        stream[1].set()
+    return stream
+
+@socketio.on('chat_cancel')
+def handle_chat_cancel(data=None):
+    """Stop the client's streaming reply; its chat_response_complete carries status 'cancelled'"""
+    stream = _stop_chat_stream(request.sid)
+    if stream is None:
+        emit('error', {'message': 'No chat reply is streaming', 'type': 'error'})
+
 @socketio.on('get_tools')
 def handle_get_tools():
     """Handle request for available tools"""
-    logger.info(f"Tools requested by {request.sid}")
     try:
         tools_info = gemini_agent.get_available_tools()
         emit('tools_response', {
             'tools': tools_info
         })
-        logger.info(f"Tools info sent to {request.sid}")
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error in handle_get_tools: {error_msg}")
@@ -1,25 +1,33 @@
+import logging
+
 from flask_socketio import Namespace, emit
+from app.utils.logs import log_event
+from app.utils.metrics import CONNECTED_CLIENTS
+
+logger = logging.getLogger(__name__)
 
 class ChatNamespace(Namespace):
     def on_connect(self):
-        print(f"Client connected to chat namespace")
+        CONNECTED_CLIENTS.labels(self.namespace).inc()
+        log_event(logger, logging.DEBUG, "chat namespace client connected")
         emit('message', {'message': 'Connected to chat WebSocket.'})  # Using 'message' event which is standard
         emit('response', {'message': 'Connected to chat WebSocket.'})  # Using previous 'response' event
     
     def on_disconnect(self):
-        print(f"Client disconnected from chat namespace")
+        CONNECTED_CLIENTS.labels(self.namespace).dec()
+        log_event(logger, logging.DEBUG, "chat namespace client disconnected")
     
     def on_message(self, data):
-        print(f"Received 'message' event with data: {data}")
+        log_event(logger, logging.DEBUG, "chat namespace event", event='message', data=data)
         self._handle_data(data)
     
     def on_chat_message(self, data):
-        print(f"Received 'chat_message' event with data: {data}")
+        log_event(logger, logging.DEBUG, "chat namespace event", event='chat_message', data=data)
         self._handle_data(data)
         
     # Standard Socket.IO event
     def on_event(self, event, *args):
-        print(f"Received custom event: {event} with args: {args}")
+        log_event(logger, logging.DEBUG, "chat namespace event", event=event, args=args)
         if args:
             self._handle_data(args[0])
             
@@ -32,7 +40,6 @@ class ChatNamespace(Namespace):
         else:
             message = str(data)
         
-        print(f"Sending response with message: {message}")
         # Emit on both standard event names to ensure compatibility
         emit('message', {'reply': f"Echo {message}"})
         emit('response', {'reply': f"Echo {message}"})
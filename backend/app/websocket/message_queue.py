@@ -0,0 +1,64 @@
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import socketio
+
+from app import config
+
+LOCAL_QUEUE_URL = "local://"
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """In-process stand-in for a message queue backend.
+
+    Every manager on the same channel receives what the others publish, so
+    several Socket.IO servers inside one process (e.g. one per test app)
+    behave like workers sharing Redis: emits, rooms and disconnects reach
+    clients connected to any of them.
+    """
+    name = 'local'
+
+    _subscribers = defaultdict(list)
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, channel='flask-socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers[channel].append(self._inbox)
+
+    def _publish(self, data):
+        with self._subscribers_lock:
+            inboxes = list(self._subscribers[self.channel])
+        for inbox in inboxes:
+            inbox.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+    def close(self):
+        """Stop receiving messages on the channel"""
+        with self._subscribers_lock:
+            if self._inbox in self._subscribers[self.channel]:
+                self._subscribers[self.channel].remove(self._inbox)
+
+
+def message_queue_options(url: Optional[str] = None, channel: Optional[str] = None,
+                          write_only: bool = False) -> Dict[str, Any]:
+    """SocketIO keyword arguments for the configured message queue.
+
+    Redis, Kafka, ZeroMQ and Kombu URLs are handed to Flask-SocketIO, which
+    picks the matching backend; `local://` selects the in-process stand-in.
+    Without a URL the server keeps its single-process client manager.
+    """
+    url = config.SOCKETIO_MESSAGE_QUEUE if url is None else url
+    channel = channel or config.SOCKETIO_CHANNEL
+    if not url:
+        return {}
+    if url == LOCAL_QUEUE_URL:
+        return {"client_manager": LocalPubSubManager(channel=channel, write_only=write_only)}
+    return {"message_queue": url, "channel": channel}
@@ -1,69 +1,101 @@
+from flask import request
 from flask_socketio import Namespace, emit
+import logging
+import math
 import requests
-import json
-import pandas as pd
-from math import radians, sin, cos, sqrt, atan2
+import threading
 import numpy as np
+from app import config
+from app.services.dataset import get_default_dataset
+from app.services.osrm_client import OSRMClient
+from app.services.risk_cube import hour_of_week
+from app.services.road_graph import load_road_graph
+from app.services.route_geometry import encode_polyline, run_length_encode, sample_route
+from app.services.safe_routing import SafeRouter
+from app.services.segment_risk import load_segment_risk, route_point_risk
+from app.websocket.tasks import task_runner
+from app.services.risk_scoring import RISK_LEVELS, PointRisk, level_names, risk_summary, segment_dominant_risk
+from app.utils.logs import log_event
+from app.utils.metrics import CONNECTED_CLIENTS, IN_FLIGHT, ROUTE_SCORING_SECONDS, ROUTES_SCORED
+from app.utils.serialization import pack_array
+
+logger = logging.getLogger(__name__)
+
+# Route payload layouts: dicts per point, an encoded polyline with run-length encoded risk, or
+# packed float32 coordinates and uint8 risk codes sent as Socket.IO binary attachments
+ROUTE_FORMATS = ('points', 'compact', 'binary')
 
 class NavigationNamespace(Namespace):
-    def __init__(self, namespace=None):
+    def __init__(self, namespace=None, dataset=None, osrm_client=None, tasks=None, router=None,
+                 segment_risk=None):
         super().__init__(namespace)
-        # Load crime data with risk factors
-        self.crime_df = pd.read_csv('app/data/Crimes_df_with_risk.csv')
-        # Convert coordinates to radians for faster distance calculation
-        self.crime_df['lat_rad'] = np.radians(self.crime_df['Latitude'])
-        self.crime_df['lng_rad'] = np.radians(self.crime_df['Longitude'])
+        # Crime data with risk factors, shared with every other blueprint and namespace
+        self.dataset = dataset or get_default_dataset()
+        self.osrm = osrm_client or OSRMClient()
+        self.tasks = tasks or task_runner
+        self._router = router
+        self._router_lock = threading.Lock()
+        self._segment_risk = segment_risk
+        self._segment_risk_loaded = segment_risk is not None
 
-    def haversine_distance(self, lat1, lon1, lat2, lon2):
-        """Calculate the great circle distance between two points on the earth"""
-        R = 6371  # Earth's radius in kilometers
+    @property
+    def risk_scorer(self):
+        return self.dataset.risk_scorer
 
-        lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
+    @property
+    def router(self):
+        """Local safest-route search, or None when no road graph has been built"""
+        if self._router is None:
+            with self._router_lock:
+                if self._router is None:
+                    graph = load_road_graph(cache_dir=self.dataset.cache_dir)
+                    if graph is not None:
+                        self._router = SafeRouter(graph)
+        return self._router
 
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distance = R * c
+    @property
+    def segment_risk(self):
+        """Precomputed per-segment risk keyed by OSM node ids, or None when none has been built"""
+        if not self._segment_risk_loaded:
+            with self._router_lock:
+                if not self._segment_risk_loaded:
+                    self._segment_risk = load_segment_risk(cache_dir=self.dataset.cache_dir)
+                    self._segment_risk_loaded = True
+        return self._segment_risk
 
-        return distance * 1000  # Convert to meters
+    def get_risk_level(self, lat, lng, radius_meters=None, departure_time=None):
+        """Get risk level for a given coordinate, at the hour of departure_time when given.
 
-    def get_risk_level(self, lat, lng, radius_meters=50):
-        """Get risk level for a given coordinate"""
+        An unparseable departure_time raises ValueError rather than falling back to Low.
+        """
+        hour = None if departure_time is None else hour_of_week(departure_time)
         try:
-            # Calculate distances using vectorized operations
-            distances = self.haversine_distance(
-                lat, lng,
-                self.crime_df['Latitude'],
-                self.crime_df['Longitude']
-            )
-
-            # Get points within radius
-            nearby_points = self.crime_df[distances <= radius_meters]
-
-            if len(nearby_points) == 0:
-                return "Low"
-
-            # Calculate average risk factor - convert to float explicitly
-            avg_risk = float(nearby_points['risk_factor'].mean())
-
-            # Determine risk level based on average risk factor
-            if avg_risk >= 7:
-                return "High"
-            elif avg_risk >= 4:
-                return "Medium"
-            else:
-                return "Low"
+            risk = self.risk_scorer.score([[lng, lat]], radius_m=radius_meters)
+            if hour is not None:
+                risk = self.dataset.risk_cube.adjust(risk, [lat], [lng], hour)
+            return RISK_LEVELS[int(risk.levels[0])]
         except Exception as e:
-            print(f"Error calculating risk level: {str(e)}")
+            log_event(logger, logging.WARNING, "risk level failed, defaulting to Low", lat=lat, lng=lng, error=str(e))
             return "Low"  # Default to low risk on error
 
     def on_connect(self):
-        print("Client connected to navigation namespace")
+        CONNECTED_CLIENTS.labels(self.namespace).inc()
+        log_event(logger, logging.DEBUG, "navigation client connected", sid=request.sid)
         emit('response', {'message': 'Connected to navigation WebSocket.'})
 
+    def on_disconnect(self):
+        CONNECTED_CLIENTS.labels(self.namespace).dec()
+
     def on_route_request(self, data):
-        print(f"Received route request with data: {data}")
+        log_event(logger, logging.DEBUG, "route request", sid=request.sid, data=data)
+        # The OSRM call and scoring run off the socket worker; results go back to this sid
+        self.tasks.spawn(self._handle_route_request, request.sid, data)
+
+    def _handle_route_request(self, sid, data):
+        with IN_FLIGHT.labels("route").track_inprogress():
+            self._route_request(sid, data)
+
+    def _route_request(self, sid, data):
         try:
             # Extract start and end coordinates from the request
             start_lat = data.get('start_lat')
@@ -72,84 +104,203 @@ class NavigationNamespace(Namespace):
             end_lng = data.get('end_lng')
 
             if not all([start_lat, start_lng, end_lat, end_lng]):
-                print("Missing coordinates in request")
-                emit('response', {'error': 'Missing required coordinates'})
+                self.emit('response', {'error': 'Missing required coordinates'}, room=sid)
                 return
 
-            # Construct OSRM API URL for multiple routes
-            url = f"http://router.project-osrm.org/route/v1/driving/{start_lng},{start_lat};{end_lng},{end_lat}?alternatives=true&overview=full&geometries=geojson&steps=true&annotations=true"
-            print(f"Calling OSRM API: {url}")
-
-            # Make request to OSRM API
-            response = requests.get(url)
-            response.raise_for_status()
-            
-            # Parse the response
-            routes_data = response.json()
-            
-            if routes_data.get('code') != 'Ok':
-                print("OSRM API returned error")
-                emit('response', {'error': 'Failed to find routes'})
+            route_format = data.get('format', 'points')
+            if route_format not in ROUTE_FORMATS:
+                self.emit('response', {'error': f'format must be one of {list(ROUTE_FORMATS)}'}, room=sid)
                 return
 
-            # Format the routes for the client
-            routes = []
-            for idx, route in enumerate(routes_data.get('routes', [])):
-                steps = []
-                route_points = []
-                
-                for leg in route.get('legs', []):
-                    for step in leg.get('steps', []):
-                        # Extract points for this step
-                        step_points = []
-                        if 'geometry' in step and 'coordinates' in step['geometry']:
-                            for coord in step['geometry']['coordinates']:
-                                # OSRM returns coordinates as [longitude, latitude]
-                                point = {
-                                    'lat': coord[1],
-                                    'lng': coord[0],
-                                    'risk_level': self.get_risk_level(coord[1], coord[0])
-                                }
-                                step_points.append(point)
-                                route_points.append(point)
-                        
-                        steps.append({
-                            'instruction': step.get('maneuver', {}).get('instruction', ''),
-                            'distance': step.get('distance', 0),
-                            'duration': step.get('duration', 0),
-                            'points': step_points,
-                            'road_name': step.get('name', 'Unknown road'),
-                            'risk_level': self._get_step_risk_level(step_points)
-                        })
-
-                route_info = {
-                    'id': idx + 1,
-                    'distance': route.get('distance', 0),
-                    'duration': route.get('duration', 0),
-                    'points': route_points,
-                    'steps': steps,
-                    'summary': {
-                        'distance_km': round(route.get('distance', 0) / 1000, 1),
-                        'duration_min': round(route.get('duration', 0) / 60, 1),
-                        'primary_road': self._get_primary_road(route),
-                        'risk_summary': self._get_route_risk_summary(route_points)
-                    }
-                }
-                routes.append(route_info)
+            # Score for the hour of the week the trip starts in, rather than around the clock
+            departure_time = data.get('departure_time')
+            try:
+                hour = None if departure_time is None else hour_of_week(departure_time)
+            except (TypeError, ValueError, OverflowError, OSError):
+                self.emit('response', {'error': f'Invalid departure_time: {departure_time}'}, room=sid)
+                return
+
+            if data.get('mode') == 'safest':
+                # Search the local road graph for routes that trade distance for lower risk
+                if self.router is None:
+                    self.emit('response', {'error': 'Safest routing is unavailable: no road graph has been built'},
+                              room=sid)
+                    return
+                # Checked here so bad options are answered before any work is queued
+                try:
+                    risk_weight, alternatives = self._safe_route_options(data)
+                except ValueError as e:
+                    self.emit('response', {'error': str(e)}, room=sid)
+                    return
+                routes_data = self.tasks.run_cpu(self.router.route, start_lat, start_lng, end_lat, end_lng,
+                                                 risk_weight, alternatives)
+            else:
+                # Fetch alternative routes, served from cache for repeated trips
+                routes_data = self.osrm.route(start_lat, start_lng, end_lat, end_lng)
+
+            if routes_data.get('code') != 'Ok':
+                log_event(logger, logging.WARNING, "OSRM returned no routes", code=routes_data.get('code'),
+                          message=routes_data.get('message'))
+                self.emit('response', {'error': 'Failed to find routes'}, room=sid)
+                return
 
-            print(f"Sending {len(routes)} routes to client")
-            emit('response', {
+            # Risk scoring is CPU-bound, so it runs on the bounded worker pool
+            routes = self.tasks.run_cpu(self._timed_build_routes, routes_data, route_format, hour)
+            log_event(logger, logging.DEBUG, "routes scored", sid=sid, routes=len(routes), format=route_format)
+            response = {
                 'routes': routes,
                 'message': f'Found {len(routes)} alternative routes',
                 'waypoints': routes_data.get('waypoints', [])
-            })
+            }
+            if route_format != 'points':
+                # Legend for the risk codes of each route's `risk`
+                response.update({'format': route_format, 'risk_levels': list(RISK_LEVELS)})
+            if hour is not None:
+                response['hour_of_week'] = hour
+            self.emit('response', response, room=sid)
 
         except requests.exceptions.RequestException as e:
-            print(f"OSRM API error: {str(e)}")
-            emit('response', {'error': f'Error calling routing service: {str(e)}'})
+            log_event(logger, logging.WARNING, "OSRM request failed", error=str(e))
+            self.emit('response', {'error': f'Error calling routing service: {str(e)}'}, room=sid)
         except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            emit('response', {'error': f'Unexpected error: {str(e)}'})
+            log_event(logger, logging.ERROR, "route request failed", error=str(e), exc_info=True)
+            self.emit('response', {'error': f'Unexpected error: {str(e)}'}, room=sid)
+
+    @staticmethod
+    def _safe_route_options(data):
+        """risk_weight as a finite number >= 0 and alternatives clamped to 1..SAFE_ROUTE_ALTERNATIVES;
+        None where the request leaves an option out"""
+        risk_weight = data.get('risk_weight')
+        if risk_weight is not None:
+            try:
+                risk_weight = float(risk_weight)
+            except (TypeError, ValueError):
+                risk_weight = math.nan
+            if not math.isfinite(risk_weight) or risk_weight < 0:
+                raise ValueError(f"risk_weight must be a number of at least 0, not {data.get('risk_weight')!r}")
+        alternatives = data.get('alternatives')
+        if alternatives is not None:
+            try:
+                alternatives = int(alternatives)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"alternatives must be an integer, not {data.get('alternatives')!r}")
+            alternatives = min(max(alternatives, 1), config.SAFE_ROUTE_ALTERNATIVES)
+        return risk_weight, alternatives
+
+    def _timed_build_routes(self, routes_data, route_format='points', hour=None):
+        """_build_routes timed on the worker itself, so time queued for the pool is not counted"""
+        with ROUTE_SCORING_SECONDS.labels(route_format).time():
+            return self._build_routes(routes_data, route_format, hour)
+
+    def _build_routes(self, routes_data, route_format='points', hour=None):
+        """Format OSRM routes for the client with per-point, per-step and per-route risk.
+
+        Each step's geometry is simplified and resampled before scoring, so
+        long routes score and send a fraction of OSRM's vertices. The compact
+        format sends each route's points once, as an encoded polyline plus
+        run-length encoded risk codes, and steps refer to them by index range.
+        The binary format does the same with packed float32 coordinates and
+        one uint8 risk code per point.
+        With an hour of the week, point risk is scaled by the risk cube's
+        factor for that hour.
+        """
+        osrm_routes = routes_data.get('routes', [])
+        parsed_routes = [self._get_route_geometry(route) for route in osrm_routes]
+        sampled_routes = [
+            sample_route(coords, step_lengths, config.ROUTE_SIMPLIFY_TOLERANCE_M, config.ROUTE_SAMPLE_SPACING_M)
+            for _, coords, step_lengths in parsed_routes
+        ]
+        risk = self._score_routes(osrm_routes, parsed_routes, sampled_routes)
+        if hour is not None and sampled_routes:
+            points = np.concatenate([points for points, _, _ in sampled_routes])
+            risk = self.dataset.risk_cube.adjust(risk, points[:, 1], points[:, 0], hour)
+        # Compact and binary routes send their points once and steps index into them
+        indexed = route_format != 'points'
+        all_levels = None if indexed else level_names(risk.levels).tolist()
+
+        # Format the routes for the client
+        routes = []
+        offset = 0
+        for idx, (route, (route_steps, _, _), (coords, _, step_lengths)) in enumerate(
+                zip(osrm_routes, parsed_routes, sampled_routes)):
+            route_codes = risk.levels[offset:offset + len(coords)]
+            # OSRM returns coordinates as [longitude, latitude]
+            route_points = None if indexed else [
+                {'lat': lat, 'lng': lng, 'risk_level': level}
+                for (lng, lat), level in zip(coords.tolist(), all_levels[offset:offset + len(coords)])
+            ]
+            offset += len(coords)
+
+            steps = []
+            step_start = 0
+            step_levels = self._get_step_risk_levels(route_codes, step_lengths)
+            for step, step_length, step_level in zip(route_steps, step_lengths.tolist(), step_levels):
+                step_end = step_start + step_length
+                steps.append({
+                    'instruction': step.get('maneuver', {}).get('instruction', ''),
+                    'distance': step.get('distance', 0),
+                    'duration': step.get('duration', 0),
+                    **({'point_range': [step_start, step_end]} if indexed
+                       else {'points': route_points[step_start:step_end]}),
+                    'road_name': step.get('name', 'Unknown road'),
+                    'risk_level': step_level
+                })
+                step_start = step_end
+
+            route_info = {
+                'id': idx + 1,
+                'distance': route.get('distance', 0),
+                'duration': route.get('duration', 0),
+                **self._route_points(route_format, coords, route_codes, route_points),
+                'steps': steps,
+                'summary': {
+                    'distance_km': round(route.get('distance', 0) / 1000, 1),
+                    'duration_min': round(route.get('duration', 0) / 60, 1),
+                    'primary_road': self._get_primary_road(route),
+                    'risk_summary': self._get_route_risk_summary(route_codes)
+                }
+            }
+            routes.append(route_info)
+        return routes
+
+    @staticmethod
+    def _route_points(route_format, coords, codes, points):
+        """A route's points and their risk in the requested format"""
+        if route_format == 'compact':
+            return {'geometry': encode_polyline(coords), 'risk': run_length_encode(codes)}
+        if route_format == 'binary':
+            return {'lat': pack_array(coords[:, 1], 'float32'), 'lng': pack_array(coords[:, 0], 'float32'),
+                    'risk': pack_array(codes, 'uint8')}
+        return {'points': points}
+
+    def _score_routes(self, routes, parsed_routes, sampled_routes):
+        """Risk of every sampled point of every alternative, concatenated in route order.
+
+        Routes whose annotation nodes are all in the segment table are scored
+        by lookup at OSRM's vertices, each sample taking the risk of the
+        vertex its segment starts at; the rest go through the spatial scorer
+        in one vectorized pass.
+        """
+        table = self.segment_risk
+        scored = []
+        for route, (_, coords, _), (_, sources, _) in zip(routes, parsed_routes, sampled_routes):
+            risk = None if table is None else route_point_risk(table, route, coords, self.dataset.incident_layer)
+            scored.append(None if risk is None else PointRisk(risk.levels[sources], risk.avg_risk[sources]))
+
+        fallback = [points for (points, _, _), risk in zip(sampled_routes, scored) if risk is None]
+        ROUTES_SCORED.labels("segments").inc(len(scored) - len(fallback))
+        ROUTES_SCORED.labels("spatial").inc(len(fallback))
+        if fallback:
+            spatial = self.risk_scorer.score(np.concatenate(fallback))
+            offset = 0
+            for i, (points, _, _) in enumerate(sampled_routes):
+                if scored[i] is None:
+                    scored[i] = PointRisk(spatial.levels[offset:offset + len(points)],
+                                          spatial.avg_risk[offset:offset + len(points)])
+                    offset += len(points)
+        if not scored:
+            return PointRisk(np.empty(0, dtype=np.uint8), np.empty(0))
+        return PointRisk(np.concatenate([r.levels for r in scored]), np.concatenate([r.avg_risk for r in scored]))
 
     def _get_primary_road(self, route):
         """Extract the primary road name from the route if available"""
@@ -162,44 +313,26 @@ class NavigationNamespace(Namespace):
             pass
         return "Unknown road"
 
-    def _get_step_risk_level(self, points):
-        """Calculate the dominant risk level for a step"""
-        risk_levels = [point['risk_level'] for point in points]
-        if not risk_levels:
-            return "Low"
-        
-        # Count occurrences of each risk level
-        risk_counts = {
-            "High": risk_levels.count("High"),
-            "Medium": risk_levels.count("Medium"),
-            "Low": risk_levels.count("Low")
-        }
-        
-        # Return the most common risk level
-        return max(risk_counts.items(), key=lambda x: x[1])[0]
-
-    def _get_route_risk_summary(self, points):
+    def _get_route_geometry(self, route):
+        """Flatten a route into its steps, an (N, 2) [lng, lat] array and per-step point counts"""
+        steps = []
+        step_coords = []
+        for leg in route.get('legs', []):
+            for step in leg.get('steps', []):
+                steps.append(step)
+                if 'geometry' in step and 'coordinates' in step['geometry']:
+                    step_coords.append([coord[:2] for coord in step['geometry']['coordinates']])
+                else:
+                    step_coords.append([])
+
+        lengths = np.fromiter((len(coords) for coords in step_coords), dtype=np.intp, count=len(step_coords))
+        coords = np.array([coord for coords in step_coords for coord in coords], dtype=np.float64).reshape(-1, 2)
+        return steps, coords, lengths
+
+    def _get_step_risk_levels(self, codes, step_lengths):
+        """Calculate the dominant risk level for each step of a route"""
+        return level_names(segment_dominant_risk(codes, step_lengths)).tolist()
+
+    def _get_route_risk_summary(self, codes):
         """Calculate risk summary for the entire route"""
-        risk_levels = [point['risk_level'] for point in points]
-        total_points = len(risk_levels)
-        
-        if total_points == 0:
-            return {
-                "high_risk_percentage": 0,
-                "medium_risk_percentage": 0,
-                "low_risk_percentage": 0,
-                "dominant_risk": "Low"
-            }
-        
-        risk_counts = {
-            "High": risk_levels.count("High"),
-            "Medium": risk_levels.count("Medium"),
-            "Low": risk_levels.count("Low")
-        }
-        
-        return {
-            "high_risk_percentage": round(risk_counts["High"] / total_points * 100, 1),
-            "medium_risk_percentage": round(risk_counts["Medium"] / total_points * 100, 1),
-            "low_risk_percentage": round(risk_counts["Low"] / total_points * 100, 1),
-            "dominant_risk": max(risk_counts.items(), key=lambda x: x[1])[0]
-        }
+        return risk_summary(codes)
@@ -0,0 +1,72 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRunner:
+    """The one place socket handlers hand off slow work.
+
+    I/O-bound jobs (Gemini and OSRM calls) run via `spawn`, which uses the
+    Socket.IO server's own background tasks: threads in threading mode,
+    green threads under eventlet or gevent. Jobs receive the requesting
+    client's sid up front and emit their results to it when they finish, so
+    a slow reply for one client never holds up another's handler.
+
+    CPU-bound steps (risk scoring) go through `run_cpu`, a bounded thread
+    pool (NumPy and SciPy release the GIL) or the hub's native thread pool
+    under eventlet/gevent, so green threads keep running while it computes.
+    """
+
+    def __init__(self, socketio=None, cpu_workers: int = None):
+        self.socketio = socketio
+        self.cpu_workers = cpu_workers or config.CPU_WORKERS
+        self._cpu_pool = None
+        self._lock = threading.Lock()
+
+    def init_socketio(self, socketio):
+        self.socketio = socketio
+
+    def spawn(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) as a background task, logging anything it fails to handle"""
+        def run():
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f"Background task {getattr(fn, '__name__', fn)} failed")
+
+        return self.socketio.start_background_task(run)
+
+    def run_cpu(self, fn, *args, **kwargs):
+        """Run CPU-bound fn on the bounded worker pool and wait for its result"""
+        async_mode = getattr(self.socketio, 'async_mode', None)
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args, **kwargs)
+        if async_mode == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+        return self._get_cpu_pool().submit(fn, *args, **kwargs).result()
+
+    def emit_to(self, sid, event, data, namespace='/'):
+        """Emit an event to a single client from outside its request context"""
+        self.socketio.emit(event, data, room=sid, namespace=namespace)
+
+    def _get_cpu_pool(self):
+        if self._cpu_pool is None:
+            with self._lock:
+                if self._cpu_pool is None:
+                    self._cpu_pool = ThreadPoolExecutor(max_workers=self.cpu_workers,
+                                                        thread_name_prefix="cpu")
+        return self._cpu_pool
+
+    def shutdown(self):
+        if self._cpu_pool is not None:
+            self._cpu_pool.shutdown(wait=False)
+
+
+# Shared by every handler and namespace of the process
+task_runner = TaskRunner()
@@ -1,20 +1,163 @@
+import threading
+import uuid
+
+from flask import request
 from flask_socketio import Namespace, emit
+from app.services.dataset import get_default_dataset
+from app.services.heatmap import check_weight, resolve_mode
+from app.services.timelapse_frames import FRAME_FORMATS, build_frame, frame_keys
+from app.utils.metrics import CONNECTED_CLIENTS, IN_FLIGHT, TIMELAPSE_PHASE_SECONDS
+from app.websocket.tasks import task_runner
+
+
+class TimelapseStream:
+    """Playback state of one client's timelapse: its frames plus cancel and seek requests"""
+
+    def __init__(self, keys):
+        self.stream_id = uuid.uuid4().hex
+        self.keys = keys
+        self.cancelled = threading.Event()
+        self._seek_to = None
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def seek(self, index):
+        with self._lock:
+            self._seek_to = index
+
+    def take_seek(self):
+        """Pending seek target, if any, cleared once read"""
+        with self._lock:
+            index, self._seek_to = self._seek_to, None
+        return index
+
+    def index_of(self, year, month=None):
+        for index, key in enumerate(self.keys):
+            if key[0] == year and (month is None or key[1] == month):
+                return index
+        return None
+
 
 class TimelapseNamespace(Namespace):
+    def __init__(self, namespace=None, dataset=None, tasks=None):
+        super().__init__(namespace)
+        self.dataset = dataset or get_default_dataset()
+        self.tasks = tasks or task_runner
+        self._streams = {}
+        self._streams_lock = threading.Lock()
+
     def on_connect(self):
+        CONNECTED_CLIENTS.labels(self.namespace).inc()
         emit('response', {'message': 'Connected to timelapse WebSocket.'})
 
+    def on_disconnect(self):
+        CONNECTED_CLIENTS.labels(self.namespace).dec()
+        self._stop_stream(request.sid)
+
     def on_timelapse_request(self, data):
-        # Return dummy heatmap data for testing
-        place = data.get('place', 'Unknown')
-        year = data.get('year', 2024)
-        dummy_heatmap = {
-            'place': place,
-            'year': year,
-            'data': [
-                {'lat': 12.9716, 'lng': 77.5946, 'intensity': 0.8},
-                {'lat': 12.2958, 'lng': 76.6394, 'intensity': 0.5},
-                {'lat': 13.0827, 'lng': 80.2707, 'intensity': 0.6}
-            ]
-        }
-        emit('response', {'data': dummy_heatmap})
+        """Stream one frame per year (or month) of crimes around a location"""
+        try:
+            years = self.dataset.years
+            lat = float(data['lat'])
+            lng = float(data.get('lng', data.get('lon')))
+            radius_km = float(data.get('radius_km', 1))
+            start_year = int(data.get('start_year', data.get('year', years[0])))
+            end_year = int(data.get('end_year', data.get('year', years[-1])))
+            keys = frame_keys(years, start_year, end_year, data.get('granularity', 'year'))
+            primary_types = data.get('primary_types')
+            if primary_types is not None and (not isinstance(primary_types, list)
+                                              or not all(isinstance(t, str) for t in primary_types)):
+                raise ValueError("primary_types must be a list of strings")
+            zoom = None if data.get('zoom') is None else int(data['zoom'])
+            resolve_mode(None, zoom)
+            weight = check_weight(data.get('weight', 'risk'))
+            frame_format = data.get('format', 'columns')
+            if frame_format not in FRAME_FORMATS:
+                raise ValueError(f"format must be one of {list(FRAME_FORMATS)}")
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            emit('response', {'error': f'Invalid timelapse request: {str(e)}'})
+            return
+
+        sid = request.sid
+        stream = TimelapseStream(keys)
+        self._stop_stream(sid)
+        with self._streams_lock:
+            self._streams[sid] = stream
+
+        emit('timelapse_start', {
+            'stream_id': stream.stream_id,
+            'frames': [{'year': year, 'month': month} for year, month in keys],
+            'total': len(keys),
+            'format': frame_format
+        })
+        self.tasks.spawn(self._stream_frames, sid, stream, lat, lng, radius_km * 1000, primary_types, zoom, weight,
+                         frame_format)
+
+    def on_timelapse_cancel(self, data=None):
+        stream = self._stop_stream(request.sid)
+        if stream is not None:
+            emit('timelapse_cancelled', {'stream_id': stream.stream_id})
+
+    def on_timelapse_seek(self, data):
+        """Jump the active stream to a frame index or a year (and month)"""
+        with self._streams_lock:
+            stream = self._streams.get(request.sid)
+        if stream is None:
+            emit('response', {'error': 'No active timelapse stream'})
+            return
+
+        # Malformed seeks (not a dict, non-numeric fields) are answered like out-of-range ones
+        try:
+            index = data.get('index')
+            if index is None and 'year' in data:
+                month = data.get('month')
+                index = stream.index_of(int(data['year']), None if month is None else int(month))
+            index = None if index is None else int(index)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            index = None
+        if index is None or not 0 <= index < len(stream.keys):
+            emit('response', {'error': f'Cannot seek to {data}'})
+            return
+        stream.seek(index)
+
+    def _stop_stream(self, sid):
+        with self._streams_lock:
+            stream = self._streams.pop(sid, None)
+        if stream is not None:
+            stream.cancel()
+        return stream
+
+    def _stream_frames(self, sid, stream, lat, lng, radius_m, primary_types, zoom, weight, frame_format='columns'):
+        """Build and emit frames in order, honouring cancel and seek between frames"""
+        index = 0
+        in_flight = IN_FLIGHT.labels("timelapse_stream")
+        in_flight.inc()
+        try:
+            while index < len(stream.keys) and not stream.cancelled.is_set():
+                seek = stream.take_seek()
+                if seek is not None:
+                    index = seek
+                year, month = stream.keys[index]
+                with TIMELAPSE_PHASE_SECONDS.labels("frame").time():
+                    frame = self.tasks.run_cpu(build_frame, self.dataset.partition(year), lat, lng, radius_m, month,
+                                               primary_types, zoom, weight, frame_format)
+                if stream.cancelled.is_set():
+                    return
+                frame.update(stream_id=stream.stream_id, index=index, total=len(stream.keys))
+                self.emit('timelapse_frame', frame, room=sid)
+                index += 1
+                # Let other clients' handlers run between frames
+                self.socketio.sleep(0)
+
+            if not stream.cancelled.is_set():
+                self.emit('timelapse_complete', {'stream_id': stream.stream_id, 'total': len(stream.keys)},
+                          room=sid)
+        except Exception as e:
+            self.emit('response', {'error': f'Timelapse stream failed: {str(e)}'}, room=sid)
+        finally:
+            in_flight.dec()
+            with self._streams_lock:
+                if self._streams.get(sid) is stream:
+                    del self._streams[sid]
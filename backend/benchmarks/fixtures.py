@@ -0,0 +1,45 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services.osrm_client import OSRMClient
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Trips across Chicago recorded by default: (start_lat, start_lng, end_lat, end_lng)
+DEFAULT_TRIPS = [
+    (41.8781, -87.6298, 41.9484, -87.6553),
+    (41.8819, -87.6278, 41.7943, -87.5907),
+    (41.9742, -87.9073, 41.8789, -87.6359),
+    (41.7508, -87.6415, 41.8676, -87.6167)
+]
+
+
+def load_fixtures(directory=FIXTURES_DIR) -> List[Dict[str, Any]]:
+    """Recorded OSRM route calls, each {"request": {start_lat, ...}, "response": {...}}"""
+    return [json.loads(path.read_text()) for path in sorted(Path(directory).glob("*.json"))]
+
+
+def record_fixtures(trips=DEFAULT_TRIPS, directory=FIXTURES_DIR, client: OSRMClient = None) -> List[Path]:
+    """Call OSRM for each trip with the parameters on_route_request uses and save the responses"""
+    client = client or OSRMClient()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, (start_lat, start_lng, end_lat, end_lng) in enumerate(trips):
+        response = client.route(start_lat, start_lng, end_lat, end_lng)
+        request = {"start_lat": start_lat, "start_lng": start_lng, "end_lat": end_lat, "end_lng": end_lng}
+        path = directory / f"route_{i:02d}.json"
+        path.write_text(json.dumps({"request": request, "response": response}))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record OSRM route responses for the navigation benchmark")
+    parser.add_argument("--out", default=str(FIXTURES_DIR))
+    parser.add_argument("--base-url", help="OSRM server (default: OSRM_BASE_URL)")
+    args = parser.parse_args()
+    for path in record_fixtures(directory=args.out, client=OSRMClient(base_url=args.base_url)):
+        print(path)
@@ -0,0 +1,315 @@
+"""Latency and memory benchmarks for dataset loading, timelapse queries, risk lookups and route scoring.
+
+Each dataset size runs in its own process on a synthetic crime CSV, so
+peak RSS and cold start times are those of a fresh server. Results are
+written as JSON; pass a previous run as --baseline to fail on regressions:
+
+    python -m benchmarks.run --rows 100000 1000000 --out bench.json
+    python -m benchmarks.run --rows 100000 --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+WORK_DIR = Path(__file__).parent / ".work"
+SCHEMA_VERSION = 1
+DEFAULT_ROWS = [100_000, 1_000_000]
+RADII_KM = [0.5, 1.0, 2.0, 5.0]
+TIMELAPSE_ZOOM = 12
+ROUTE_FORMATS = [("points", None), ("compact", None), ("binary", None), ("compact", "2025-05-23T18:30:00")]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency statistics in milliseconds"""
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": len(ms),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "min": round(float(ms.min()), 3),
+        "max": round(float(ms.max()), 3)
+    }
+
+
+def timed(fn: Callable, repeat: int = 1) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def payload_size(data) -> int:
+    """Bytes of an emitted payload, with binary attachments replaced by placeholders as Socket.IO sends them"""
+    attachments = []
+
+    def placeholder(value):
+        attachments.append(len(value))
+        return {"_placeholder": True, "num": len(attachments) - 1}
+
+    return len(json.dumps(data, default=placeholder)) + sum(attachments)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+class FixtureOSRM:
+    """Stands in for OSRMClient, answering each trip with its recorded response"""
+
+    base_url = "fixtures"
+
+    def __init__(self, fixtures):
+        self.responses = {self.key(**f["request"]): f["response"] for f in fixtures}
+
+    @staticmethod
+    def key(start_lat, start_lng, end_lat, end_lng):
+        return tuple(round(float(v), 6) for v in (start_lat, start_lng, end_lat, end_lng))
+
+    def route(self, start_lat, start_lng, end_lat, end_lng, **params):
+        return self.responses[self.key(start_lat, start_lng, end_lat, end_lng)]
+
+
+def route_fixtures(frame, rng, count: int, directory=None):
+    """Recorded OSRM fixtures, or synthetic OSRM-shaped responses starting at random crimes when none exist"""
+    from benchmarks.fixtures import FIXTURES_DIR, load_fixtures
+    from benchmarks.synthetic import synthetic_route_response
+
+    fixtures = load_fixtures(directory or FIXTURES_DIR)
+    if fixtures:
+        return fixtures, "recorded"
+    for i in rng.integers(0, len(frame), count):
+        response = synthetic_route_response(rng, float(frame['Latitude'].iat[i]), float(frame['Longitude'].iat[i]))
+        (start_lng, start_lat), (end_lng, end_lat) = (w["location"] for w in response["waypoints"])
+        request = {"start_lat": start_lat, "start_lng": start_lng, "end_lat": end_lat, "end_lng": end_lng}
+        fixtures.append({"request": request, "response": response})
+    return fixtures, "synthetic"
+
+
+def run_rows(rows: int, args) -> Dict:
+    """Benchmark one dataset size in this process; the app is imported here, after its environment is set"""
+    cache_dir = WORK_DIR / "cache" / str(rows)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.environ["CACHE_DIR"] = str(cache_dir)
+    os.environ.setdefault("CHAT_MODEL", "echo")
+    os.environ.setdefault("INCIDENT_INGEST_INTERVAL", "0")
+
+    from app import create_app
+    from benchmarks.synthetic import synthetic_csv
+    from app.services.dataset import CrimeDataset
+    from app.websocket.navigation_ws import NavigationNamespace
+    from app.websocket.tasks import TaskRunner
+
+    csv_path = synthetic_csv(rows, WORK_DIR / "data", args.years, args.seed)
+    rng = np.random.default_rng(args.seed)
+    timings, rss = {}, {"imports": peak_rss_mb()}
+
+    # Startup: parse the CSV, build the grid, cube and partitions, then the app
+    timings["dataset/load_cold"] = timed(lambda: CrimeDataset(csv_path, cache_dir).frame)
+    timings["dataset/load_warm"] = timed(lambda: CrimeDataset(csv_path, cache_dir).frame, args.repeat)
+    dataset = CrimeDataset(csv_path, cache_dir)
+    dataset.frame
+    timings["dataset/preload_cold"] = timed(dataset.preload)
+    warm = CrimeDataset(csv_path, cache_dir)
+    warm.frame
+    timings["dataset/preload_warm"] = timed(warm.preload)
+    del warm
+    app = [None]
+    timings["app/startup"] = timed(lambda: app.__setitem__(0, create_app(dataset=dataset)))
+    client = app[0].test_client()
+    rss["startup"] = peak_rss_mb()
+
+    # Timelapse queries centred on random crimes of each year
+    for year in dataset.years:
+        frame = dataset.partition(year).frame
+        centres = rng.integers(0, len(frame), args.repeat)
+        for radius_km in RADII_KM:
+            for mode, zoom in (("points", None), ("aggregate", TIMELAPSE_ZOOM)):
+                samples = []
+                for i in centres:
+                    query = {"lat": frame['Latitude'].iat[i], "lon": frame['Longitude'].iat[i],
+                             "radius_km": radius_km, "year": year, "mode": mode}
+                    if zoom is not None:
+                        query["zoom"] = zoom
+                    start = time.perf_counter()
+                    response = client.get("/timelapse/", query_string=query)
+                    samples.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"timelapse {query} failed: {response.get_data(as_text=True)}")
+                timings[f"timelapse/{mode}/r{radius_km:g}km/{year}"] = samples
+    rss["timelapse"] = peak_rss_mb()
+
+    # Single point risk lookups around random crimes
+    navigation = NavigationNamespace('/navigation', dataset=dataset, tasks=TaskRunner())
+    frame = dataset.frame
+    picks = rng.integers(0, len(frame), args.risk_points)
+    lats = frame['Latitude'].to_numpy()[picks] + rng.normal(0, 0.002, len(picks))
+    lngs = frame['Longitude'].to_numpy()[picks] + rng.normal(0, 0.002, len(picks))
+    for name, departure_time in (("risk_level", None), ("risk_level/departure_time", "now")):
+        samples = []
+        for lat, lng in zip(lats.tolist(), lngs.tolist()):
+            start = time.perf_counter()
+            navigation.get_risk_level(lat, lng, departure_time=departure_time)
+            samples.append(time.perf_counter() - start)
+        timings[name] = samples
+    rss["risk_level"] = peak_rss_mb()
+
+    # Full route requests: OSRM response in, scored and formatted response out
+    fixtures, fixture_source = route_fixtures(frame, rng, args.routes, args.fixtures)
+    navigation.osrm = FixtureOSRM(fixtures)
+    emitted = []
+    navigation.emit = lambda event, data, room=None, **kwargs: emitted.append(data)
+    payload_bytes = {}
+    for route_format, departure_time in ROUTE_FORMATS:
+        name = f"route/{route_format}" + ("/departure_time" if departure_time else "")
+        samples, sizes = [], []
+        for _ in range(args.repeat):
+            for fixture in fixtures:
+                request = {**fixture["request"], "format": route_format}
+                if departure_time:
+                    request["departure_time"] = departure_time
+                emitted.clear()
+                start = time.perf_counter()
+                navigation._handle_route_request("benchmark", request)
+                samples.append(time.perf_counter() - start)
+                if not emitted or "error" in emitted[-1]:
+                    raise RuntimeError(f"{name} failed: {emitted[-1] if emitted else 'no response'}")
+                sizes.append(payload_size(emitted[-1]))
+        timings[name] = samples
+        payload_bytes[name] = int(np.mean(sizes))
+    rss["route"] = peak_rss_mb()
+
+    return {
+        "rows": rows,
+        "years": dataset.years,
+        "route_fixtures": fixture_source,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_mb": rss,
+        "payload_bytes": payload_bytes,
+        "timings": {name: summarize(samples) for name, samples in timings.items()}
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, min_ms: float) -> List[str]:
+    """Timings whose median got more than `tolerance` slower than the baseline's"""
+    regressions = []
+    for rows, run in results["runs"].items():
+        base_run = baseline.get("runs", {}).get(rows)
+        if base_run is None:
+            continue
+        # Synthetic and recorded routes differ in shape, so their timings are not comparable
+        same_routes = run.get("route_fixtures") == base_run.get("route_fixtures")
+        for name, stats in run["timings"].items():
+            base = base_run["timings"].get(name)
+            if base is None or base["p50"] < min_ms or (name.startswith("route/") and not same_routes):
+                continue
+            if stats["p50"] > base["p50"] * (1 + tolerance):
+                regressions.append(f"{rows} rows {name}: p50 {base['p50']:.2f} -> {stats['p50']:.2f} ms "
+                                   f"(+{stats['p50'] / base['p50'] - 1:.0%})")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dataset loading, timelapse, risk lookups and routes")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="synthetic dataset sizes")
+    parser.add_argument("--years", type=int, nargs=2, default=(2019, 2025), metavar=("FIRST", "LAST"))
+    parser.add_argument("--repeat", type=int, default=5, help="samples per timelapse query and route")
+    parser.add_argument("--risk-points", type=int, default=1000, help="get_risk_level calls")
+    parser.add_argument("--routes", type=int, default=4, help="synthetic trips when no fixtures are recorded")
+    parser.add_argument("--fixtures", default=None, help="recorded OSRM responses (default: benchmarks/fixtures)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore timings faster than this in the baseline")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # One dataset size in a fresh process; the parent reads the result file
+        Path(args.child).write_text(json.dumps(run_rows(args.rows[0], args)))
+        return
+
+    (WORK_DIR / "logs").mkdir(parents=True, exist_ok=True)
+    runs = {}
+    for rows in args.rows:
+        result_path = WORK_DIR / f"result_{rows}.json"
+        log_path = WORK_DIR / "logs" / f"{rows}.log"
+        print(f"Benchmarking {rows} rows (log: {log_path})", file=sys.stderr)
+        command = [sys.executable, "-m", "benchmarks.run", "--child", str(result_path), "--rows", str(rows),
+                   "--years", *map(str, args.years), "--repeat", str(args.repeat),
+                   "--risk-points", str(args.risk_points), "--routes", str(args.routes), "--seed", str(args.seed)]
+        if args.fixtures:
+            command += ["--fixtures", args.fixtures]
+        with open(log_path, "w") as log:
+            completed = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT,
+                                       cwd=Path(__file__).parent.parent)
+        if completed.returncode != 0:
+            sys.exit(f"Benchmark of {rows} rows failed, see {log_path}")
+        runs[str(rows)] = json.loads(result_path.read_text())
+
+    results = {
+        "schema": SCHEMA_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: getattr(args, key) for key in ("years", "repeat", "risk_points", "routes", "seed", "fixtures")},
+        "runs": runs
+    }
+    output = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(output)
+    else:
+        print(output)
+
+    if any(run["route_fixtures"] == "synthetic" for run in runs.values()):
+        print("No recorded OSRM fixtures found, route timings use synthetic routes; "
+              "record some with python -m benchmarks.fixtures", file=sys.stderr)
+    for rows, run in runs.items():
+        print(f"{rows} rows: peak RSS {run['peak_rss_mb']} MB", file=sys.stderr)
+        for name, stats in run["timings"].items():
+            print(f"  {name:<44} p50 {stats['p50']:>10.2f} ms  p95 {stats['p95']:>10.2f} ms  n={stats['n']}",
+                  file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        for rows, run in runs.items():
+            base_run = baseline.get("runs", {}).get(rows)
+            if base_run is not None and base_run.get("route_fixtures") != run["route_fixtures"]:
+                print(f"{rows} rows: route timings not compared, the baseline used {base_run.get('route_fixtures')} "
+                      f"routes and this run {run['route_fixtures']} ones", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance, args.min_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
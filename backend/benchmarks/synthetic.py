@@ -0,0 +1,127 @@
+import argparse
+import math
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.services.crime_data import CRIMES_CSV
+from app.utils.geo import METERS_PER_DEGREE
+from app.utils.serialization import format_dates
+
+DEFAULT_YEARS = (2019, 2025)
+# Spread of generated crimes around the template crime each one copies
+JITTER_M = 150.0
+
+
+def generate_crimes(rows: int, years: Sequence[int] = DEFAULT_YEARS, seed: int = 0,
+                    template_csv=CRIMES_CSV, jitter_m: float = JITTER_M) -> pd.DataFrame:
+    """A synthetic crime table with the schema of Crimes_df_with_risk.csv.
+
+    Each row copies a random template crime, so the mix of types,
+    descriptions, districts, severities and risk levels stays realistic,
+    then moves it up to a few hundred meters and onto a random day of a
+    year in `years` (inclusive) at the template's time of day, which keeps
+    both the spatial clustering and the hour-of-day profile of the real data.
+    """
+    rng = np.random.default_rng(seed)
+    template = pd.read_csv(template_csv).dropna(subset=['Latitude', 'Longitude'])
+    df = template.iloc[rng.integers(0, len(template), rows)].reset_index(drop=True)
+
+    df['ID'] = np.arange(1, rows + 1, dtype=np.int64)
+    lat = df['Latitude'].to_numpy() + rng.normal(0.0, jitter_m, rows) / METERS_PER_DEGREE
+    lng = df['Longitude'].to_numpy() + (rng.normal(0.0, jitter_m, rows) / METERS_PER_DEGREE
+                                        / np.cos(np.radians(lat)))
+    df['Latitude'] = np.round(lat, 9)
+    df['Longitude'] = np.round(lng, 9)
+
+    times = pd.to_datetime(df['Date'], format='%Y-%m-%d %H:%M:%S')
+    time_of_day = (times - times.dt.normalize()).to_numpy()
+    year = rng.integers(years[0], years[-1] + 1, rows)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    day = (rng.random(rows) * np.where(leap, 366, 365)).astype(np.int64)
+    dates = pd.Series((year - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+                      + day.astype('timedelta64[D]') + time_of_day)
+    df['Date'] = format_dates(dates)
+    df['month'] = dates.dt.month.to_numpy()
+    df['year'] = year
+    return df[template.columns]
+
+
+def synthetic_csv(rows: int, directory, years: Sequence[int] = DEFAULT_YEARS, seed: int = 0) -> Path:
+    """Path of a generated crime CSV, written once per row count, years and seed and reused after"""
+    path = Path(directory) / f"crimes_{rows}_{years[0]}-{years[-1]}_s{seed}.csv"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        generate_crimes(rows, years, seed).to_csv(tmp_path, index=False)
+        tmp_path.replace(path)
+    return path
+
+
+def synthetic_route_response(rng: np.random.Generator, start_lat: float, start_lng: float,
+                             alternatives: int = 3, length_m: float = 8000.0,
+                             spacing_m: float = 15.0) -> Dict[str, Any]:
+    """An OSRM /route response (overview=full, geojson, steps, annotations) for a made-up trip.
+
+    Each alternative turns between north-south and east-west streets every
+    few hundred meters, with a vertex every `spacing_m` like OSRM's full
+    overview of curving roads, so scoring and formatting see realistic
+    point counts. Node ids are synthetic and match no segment table.
+    """
+    routes = []
+    for alternative in range(alternatives):
+        lat, lng = start_lat, start_lng
+        heading = alternative % 2
+        coords = [[lng, lat]]
+        steps, travelled, node_id = [], 0.0, 1 + alternative * 10 ** 6
+        while travelled < length_m:
+            leg_m = float(rng.uniform(200, 1500))
+            points = max(int(leg_m / spacing_m), 1)
+            sign = 1 if rng.random() < 0.7 else -1
+            step_coords = [[lng, lat]]
+            for _ in range(points):
+                if heading == 0:
+                    lat += sign * spacing_m / METERS_PER_DEGREE
+                else:
+                    lng += sign * spacing_m / METERS_PER_DEGREE / math.cos(math.radians(lat))
+                step_coords.append([round(lng, 6), round(lat, 6)])
+            coords.extend(step_coords[1:])
+            steps.append({
+                "name": f"{'North' if heading == 0 else 'East'} Street {len(steps) + 1}",
+                "distance": round(points * spacing_m, 1),
+                "duration": round(points * spacing_m / 11.0, 1),
+                "geometry": {"type": "LineString", "coordinates": step_coords},
+                "maneuver": {"instruction": "Head on" if not steps else "Turn", "type": "turn"}
+            })
+            travelled += points * spacing_m
+            heading = 1 - heading
+        steps.append({"name": steps[-1]["name"], "distance": 0, "duration": 0,
+                      "geometry": {"type": "LineString", "coordinates": [coords[-1], coords[-1]]},
+                      "maneuver": {"instruction": "You have arrived at your destination", "type": "arrive"}})
+        routes.append({
+            "distance": round(travelled, 1),
+            "duration": round(travelled / 11.0, 1),
+            "weight": round(travelled / 11.0, 1),
+            "weight_name": "routability",
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "legs": [{"steps": steps, "distance": round(travelled, 1),
+                      "annotation": {"nodes": list(range(node_id, node_id + len(coords)))}}]
+        })
+    return {
+        "code": "Ok",
+        "routes": routes,
+        "waypoints": [{"location": routes[0]["geometry"]["coordinates"][0], "name": ""},
+                      {"location": routes[0]["geometry"]["coordinates"][-1], "name": ""}]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic crime CSV with the dataset's schema")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--years", type=int, nargs=2, default=DEFAULT_YEARS, metavar=("FIRST", "LAST"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmarks/.work")
+    args = parser.parse_args()
+    print(synthetic_csv(args.rows, args.out, args.years, args.seed))
@@ -0,0 +1,32 @@
+"""Gunicorn settings for serving CitiSafe with several worker processes.
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers share clients and rooms through SOCKETIO_MESSAGE_QUEUE, so it must be
+set whenever WEB_CONCURRENCY is above 1. Gunicorn does not balance with
+sticky sessions, so clients of a multi-worker server must connect with the
+websocket transport only; to allow long-polling, run one worker per port
+behind a load balancer with sticky sessions (e.g. nginx ip_hash) instead.
+"""
+import os
+
+# Load the crime dataset and risk grid once in the master before forking, so
+# workers share them copy-on-write instead of each reading the data again
+os.environ.setdefault("PRELOAD_DATASET", "true")
+preload_app = True
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+
+# Each Socket.IO async mode needs its matching worker type
+_async_mode = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+worker_class = {
+    "threading": "gthread",
+    "eventlet": "eventlet",
+    "gevent": "geventwebsocket.gunicorn.workers.GeventWebSocketWorker"
+}[_async_mode]
+# Concurrent connections per worker in threading mode; eventlet and gevent use worker_connections
+threads = int(os.getenv("WORKER_THREADS", "100"))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
+# WebSocket connections are long-lived; don't recycle workers that are merely idle on them
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
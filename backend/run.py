@@ -1,3 +1,5 @@
+import os
+
 from app import create_app
 from app.websocket.chat_handler import socketio
 
@@ -11,4 +13,5 @@ if __name__ == "__main__":
     print("  - Socket.IO URL: http://localhost:5001/socket.io")
     print("=====================\n")
     
-    socketio.run(app, host='0.0.0.0', port=5001, debug=True)
+    # Single-process development server; see gunicorn.conf.py for running several workers
+    socketio.run(app, host='0.0.0.0', port=5001, debug=os.getenv("FLASK_DEBUG", "true").lower() in ("1", "true"))
@@ -0,0 +1,71 @@
+import threading
+import uuid
+
+import pytest
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO
+from werkzeug.serving import make_server
+
+from app.websocket.message_queue import LOCAL_QUEUE_URL, message_queue_options
+
+
+def make_socketio(channel):
+    app = Flask(__name__)
+    return app, SocketIO(app, async_mode="threading", **message_queue_options(LOCAL_QUEUE_URL, channel=channel))
+
+
+@pytest.fixture
+def served():
+    """Serve apps on free local ports; Flask-SocketIO's test client refuses a message queue"""
+    servers = []
+
+    def serve(app):
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+def connect(url):
+    """A long-polling client, and the events it received as (name, data) once `arrived` is set"""
+    client = socketio.Client()
+    received = []
+    arrived = threading.Event()
+
+    @client.on("*")
+    def any_event(event, data):
+        received.append((event, data))
+        arrived.set()
+
+    client.connect(url, transports=["polling"])
+    return client, received, arrived
+
+
+def test_emit_reaches_client_of_another_app_on_the_channel(served):
+    channel = f"test-{uuid.uuid4().hex}"
+    app, _ = make_socketio(channel)
+    _, publisher = make_socketio(channel)
+    client, received, arrived = connect(served(app))
+    try:
+        publisher.emit("alert", {"message": "Incident reported nearby"})
+        assert arrived.wait(5)
+        assert received == [("alert", {"message": "Incident reported nearby"})]
+    finally:
+        client.disconnect()
+
+
+def test_emit_stays_on_its_channel(served):
+    app, _ = make_socketio(f"test-{uuid.uuid4().hex}")
+    _, publisher = make_socketio(f"test-{uuid.uuid4().hex}")
+    client, received, arrived = connect(served(app))
+    try:
+        publisher.emit("alert", {"message": "Incident reported nearby"})
+        assert not arrived.wait(0.5)
+        assert received == []
+    finally:
+        client.disconnect()
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from app.services.route_geometry import (decode_polyline, encode_polyline, run_length_encode, sample_line,
+                                         sample_route, simplify_mask)
+from app.utils.geo import METERS_PER_DEGREE, haversine_m
+
+# Roughly 15 m apart heading north, then east, from downtown Chicago, at OSRM's 6 decimal places
+NORTH = [[-87.6298, round(41.8781 + i * 15 / METERS_PER_DEGREE, 6)] for i in range(20)]
+CORNER = NORTH + [[round(NORTH[-1][0] + i * 20 / METERS_PER_DEGREE, 6), NORTH[-1][1]] for i in range(1, 20)]
+
+
+def test_polyline_matches_reference_encoding():
+    # Example from Google's encoded polyline documentation, at precision 5
+    coords = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+    assert encode_polyline(coords, precision=5) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert np.asarray(decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@", precision=5)) == pytest.approx(np.asarray(coords))
+
+
+@pytest.mark.parametrize("coords", [
+    [],
+    [[-87.6298, 41.8781]],
+    [[-87.6298, 41.8781], [-87.6298, 41.8781], [-87.6298, 41.8781]],
+    CORNER + [CORNER[0]],
+    [[-180.0, -85.0], [180.0, 85.0], [0.000001, -0.000001]]
+])
+def test_polyline_round_trip(coords):
+    decoded = decode_polyline(encode_polyline(coords))
+    assert np.asarray(decoded).reshape(-1, 2) == pytest.approx(np.asarray(coords).reshape(-1, 2), abs=1e-9)
+
+
+def test_polyline_rounds_to_precision():
+    assert decode_polyline(encode_polyline([[-87.62981234, 41.87814567]])) == [[-87.629812, 41.878146]]
+
+
+@pytest.mark.parametrize("n", [0, 1, 2])
+def test_simplify_keeps_short_lines(n):
+    lat = np.full(n, 41.8781)
+    assert simplify_mask(lat, lat, 5.0).tolist() == [True] * n
+
+
+def test_simplify_drops_collinear_points_and_keeps_corners():
+    coords = np.asarray(CORNER)
+    keep = simplify_mask(coords[:, 1], coords[:, 0], 1.0)
+    assert np.flatnonzero(keep).tolist() == [0, len(NORTH) - 1, len(CORNER) - 1]
+
+
+def test_simplify_zero_tolerance_keeps_everything():
+    coords = np.asarray(CORNER)
+    assert simplify_mask(coords[:, 1], coords[:, 0], 0.0).all()
+
+
+def test_simplify_duplicate_vertices():
+    coords = np.asarray([NORTH[0], NORTH[0], NORTH[0]])
+    assert np.flatnonzero(simplify_mask(coords[:, 1], coords[:, 0], 1.0)).tolist() == [0, 2]
+
+
+def test_simplify_closed_loop_keeps_the_far_side():
+    coords = np.asarray(CORNER + [CORNER[0]])
+    keep = simplify_mask(coords[:, 1], coords[:, 0], 1.0)
+    assert keep[0] and keep[-1]
+    assert keep[len(NORTH) - 1] and keep[len(CORNER) - 1]
+
+
+def test_sample_line_empty_and_single_point():
+    points, sources = sample_line(np.empty((0, 2)), 1.0, 10.0)
+    assert points.shape == (0, 2) and sources.tolist() == []
+    points, sources = sample_line([NORTH[0]], 1.0, 10.0)
+    assert points.tolist() == [NORTH[0]] and sources.tolist() == [0]
+
+
+def test_sample_line_zero_spacing_only_simplifies():
+    points, sources = sample_line(CORNER, 1.0, 0.0)
+    assert sources.tolist() == [0, len(NORTH) - 1, len(CORNER) - 1]
+    assert points.tolist() == [CORNER[i] for i in sources.tolist()]
+
+
+def test_sample_line_spaces_points_along_the_original_line():
+    points, sources = sample_line(CORNER, 1.0, 50.0)
+    gaps = haversine_m(points[:-1, 1], points[:-1, 0], points[1:, 1], points[1:, 0])
+    assert gaps.max() <= 50.0 + 0.5
+    assert points[0].tolist() == CORNER[0] and points[-1].tolist() == CORNER[-1]
+    # Source vertices run in order along the line
+    assert np.all(np.diff(sources) >= 0)
+    assert sources.min() >= 0 and sources.max() <= len(CORNER) - 1
+
+
+def test_sample_line_duplicate_vertices():
+    coords = [NORTH[0], NORTH[0], NORTH[5], NORTH[5], NORTH[10]]
+    points, sources = sample_line(coords, 1.0, 20.0)
+    gaps = haversine_m(points[:-1, 1], points[:-1, 0], points[1:, 1], points[1:, 0])
+    assert np.isfinite(points).all()
+    assert gaps.max() <= 20.0 + 0.5
+    assert points[-1].tolist() == NORTH[10]
+
+
+def test_sample_line_closed_loop():
+    loop = CORNER + [CORNER[0]]
+    points, sources = sample_line(loop, 1.0, 100.0)
+    assert points[0].tolist() == points[-1].tolist() == CORNER[0]
+    assert sources[-1] == len(loop) - 1
+
+
+def test_sample_route_empty_and_one_point_steps():
+    coords = np.asarray(NORTH[:5] + [NORTH[4]] + CORNER[20:25], dtype=np.float64)
+    points, sources, lengths = sample_route(coords, [5, 0, 1, 5], 1.0, 0.0)
+    assert lengths.tolist() == [2, 0, 1, 2]
+    assert len(points) == lengths.sum()
+    assert sources.tolist() == [0, 4, 5, 6, 10]
+    assert points.tolist() == coords[sources].tolist()
+
+
+def test_sample_route_without_steps():
+    points, sources, lengths = sample_route(np.empty((0, 2)), [], 1.0, 10.0)
+    assert points.shape == (0, 2) and sources.tolist() == [] and lengths.tolist() == []
+
+
+@pytest.mark.parametrize("codes, runs", [
+    ([], []),
+    ([2], [[2, 1]]),
+    ([0, 0, 0], [[0, 3]]),
+    ([0, 0, 1, 2, 2, 0], [[0, 2], [1, 1], [2, 2], [0, 1]])
+])
+def test_run_length_encode(codes, runs):
+    assert run_length_encode(np.asarray(codes, dtype=np.uint8)) == runs
+    assert [value for value, length in runs for _ in range(length)] == codes
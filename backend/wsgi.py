@@ -0,0 +1,11 @@
+"""WSGI entry point for running several worker processes, e.g. under gunicorn.conf.py"""
+import gc
+
+from app import config, create_app
+
+app = create_app()
+
+if config.PRELOAD_DATASET:
+    # Everything loaded so far lives in the master; keep the collector from
+    # touching (and so copying) those pages in every forked worker
+    gc.freeze()